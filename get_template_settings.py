@@ -2,9 +2,10 @@
 import sys
 
 # project modules
-from helpers.ETM_API import ETM_API, SessionWithUrlBase
+from helpers.ETM_API import SessionWithUrlBase
 from helpers.helpers import process_arguments, print_bold
 from helpers.Template import TemplateCollection
+from helpers.settings import Settings
 
 if __name__ == "__main__":
 
@@ -22,30 +23,14 @@ if __name__ == "__main__":
     else:
         print_bold("\nScenario user value settings will be obtained")
     
-    for index, template in enumerate(templates, start=1):
-        print(f"\nProcessing scenario template \"{template.title}\" ({index} of {len(templates.collection)} scenarios)")
-        API_template = ETM_API(session, template)
-        template.add_user_values(API_template.get_scenario_settings())
-        
-        if complete_mode:
-            template.add_balanced_values(API_template.get_scenario_settings(settings_type='balanced_values'))
+    templates.harvest(session, complete_mode, max_workers=Settings.get('concurrent_templates') or 1)
 
-            print('Obtaining heat network orders')
-            template.add_heat_network_orders(API_template.get_heat_network_orders(template.heat_orders))
-        
-            print("Obtaining custom curve CSVs")
-            template.add_custom_curves(API_template.get_custom_curves())
-            template.custom_curves_to_csv()
-
-            print("Obtaining custom orders CSVs")
-            template.add_custom_orders(API_template.get_custom_orders(template.custom_orders))
-            template.custom_orders_to_csv()
-    
-    templates.to_csv('template_settings')
+    chunk_size = Settings.get('template_export_chunk_size')
+    templates.to_csv('template_settings', chunk_size=chunk_size)
 
     if complete_mode:
         # Set to false to obtain balanced values
-        templates.to_csv('template_settings_balanced_values', user_values=False)
+        templates.to_csv('template_settings_balanced_values', user_values=False, chunk_size=chunk_size)
         templates.heat_network_orders_to_csv()
     
     print("\nDone!")
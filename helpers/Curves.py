@@ -1,7 +1,11 @@
+import numpy as np
 import pandas as pd
 
-from helpers.file_helpers import read_csv, get_folder, check_duplicates
+from helpers.file_helpers import (read_csv, check_duplicates, output_path, output_format,
+    write_output, OUTPUT_FORMATS, DEFAULT_CSV_FORMAT)
 from helpers.helpers import exit
+from helpers.curve_store import CurveStore
+from helpers.settings import Settings
 
 
 class CurveFile:
@@ -23,12 +27,8 @@ class CurveFile:
 
 
     def _validate_types(self, data_df):
-        # Generate series returning True for all columns of numeric type
-        type_series = data_df.apply(
-                        lambda s: pd.to_numeric(s, errors='coerce')
-                        .notnull().all())
-        # Exit if one column contains non-numeric values
-        if not type_series.all():
+        # Exit if one column contains non-numeric, missing or infinite values
+        if not (data_df.dtypes == np.float64).all() or not np.isfinite(data_df.to_numpy()).all():
             exit("All curves should only consist of numeric values "
                   f"Please check {self.file_name}")
 
@@ -45,14 +45,23 @@ class CurveFile:
 
 
     def _add_curves(self, data_df):
-        '''Create and add a Curve for each column in the data_df'''
-        for key, arr in data_df.items():
+        '''Create and add a Curve with a contiguous float array for each column in the data_df'''
+        values = np.ascontiguousarray(data_df.to_numpy(dtype=np.float64).T)
+
+        for key, arr in zip(data_df.columns, values):
             self.curves.add(Curve(key, arr))
 
 
     @classmethod
     def from_csv(cls, file_name):
-        return cls(file_name, read_csv(file_name, curve=True, dtype=str))
+        '''Reads the curve file, parsing each column straight to floats'''
+        try:
+            data_df = read_csv(file_name, curve=True, dtype=np.float64, engine='c')
+        except ValueError:
+            exit("All curves should only consist of numeric values "
+                  f"Please check {file_name}")
+
+        return cls(file_name, data_df)
 
 
 class Curve():
@@ -65,17 +74,27 @@ class Curve():
 
     def to_csv(self, folder=''):
         """
-        Export the Curve to a csv file if it does not already exist.
+        Export the Curve to a file in the output_format (csv by default) if it does
+        not already exist. Parquet and feather files have one column named after the key.
+        When curve_store is set, the curve is added to the curve store of the folder instead.
 
         Params:
             folder (str): Subfolder within the output_curves_folder where the curve should be written.
                         Defaults to the output_curves_folder itself.
         """
-        path = get_folder('output_curves_folder') / folder / f"{self.key}.csv"
-        path.parent.mkdir(parents=True, exist_ok=True)
+        if Settings.get('curve_store'):
+            store = CurveStore.in_folder('output_curves_folder', folder)
+            if self.key not in store:
+                store.put({self.key: self.data})
+            else:
+                print(f"Curve {self.key} already exists in {store.folder}. Skipping export.")
+            return
+
+        path = output_path(self.key, folder, OUTPUT_FORMATS[output_format()], kind='output_curves_folder')
 
         if not path.exists():
-            pd.Series(self.data).to_csv(path, index=False, header=False)
+            write_output(pd.DataFrame({self.key: self.data}), self.key, folder,
+                kind='output_curves_folder', header=False, **DEFAULT_CSV_FORMAT)
         else:
             print(f"File {path} already exists. Skipping export.")
 
@@ -1,35 +1,202 @@
 import io
+import itertools
+import math
+import os
+import re
+import threading
+import time
+import weakref
+import numpy as np
 import pandas as pd
 import requests
 import json
 
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
 from contextlib import suppress
 from json.decoder import JSONDecodeError
 
+from helpers.concurrency import map_concurrently
+from helpers.curve_manifest import CurveManifest
 from helpers.helpers import exit, warn
+from helpers.response_cache import ResponseCache
 from helpers.settings import Settings
 
+DEFAULT_POOL_SIZE = 10
+DOWNLOAD_CHUNK_SIZE = 2 ** 16
+CURVE_LENGTH = 8760
+
+# Requests to a url matching this belong to the scenario with the matched id
+SCENARIO_URL = re.compile(r'^/scenarios/(\d+)(?:/|$|\?)')
+
+# Only idempotent requests (so not the POST creating a scenario) are retried on these
+RETRY_STATUSES = [502, 503, 504]
+
 
 class SessionWithUrlBase(requests.Session):
     """
-    Helper class to store the base url.
+    Helper class to store the base url. Connections to the engine are pooled
+    and kept alive, and failed requests are retried, as set in settings.yml.
+    When max_concurrent_requests is set, at most that many requests are sent
+    through the session at the same time, by all threads together.
+
+    When response_cache is set, GET requests are answered from a persistent
+    ResponseCache when possible. Cached responses of a scenario are used as long
+    as the updated_at (and ETag) of the scenario did not change. It is looked up
+    once per session, and looked up again after the session changed the scenario.
     """
 
     def __init__(self, url_base=None, *args, **kwargs):
         super(SessionWithUrlBase, self).__init__(*args, **kwargs)
         self.url_base = url_base
+        self.keep_alive = Settings.get('connection_keep_alive') is not False
+
+        max_requests = Settings.get('max_concurrent_requests')
+        self.request_limit = threading.BoundedSemaphore(max_requests) if max_requests else None
+
+        self.cache = ResponseCache() if Settings.get('response_cache') else None
+        self._validators = {}
 
         if Settings.get('proxy_servers'):
             self.proxies = Settings.get('proxy_servers')
 
-    def request(self, method, url, headers={}, **kwargs):
-        modified_url = self.url_base + url
+        adapter = self.create_adapter()
+        self.mount('http://', adapter)
+        self.mount('https://', adapter)
+
+    @staticmethod
+    def create_adapter():
+        """
+        Returns a HTTPAdapter with the pool size and retry settings from settings.yml
+        """
+        pool_size = Settings.get('connection_pool_size') or DEFAULT_POOL_SIZE
+        retries = Retry(
+            total=Settings.get('connection_retries') or 0,
+            backoff_factor=Settings.get('connection_backoff_factor') or 0,
+            status_forcelist=RETRY_STATUSES,
+            raise_on_status=False
+        )
+
+        return HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retries)
+
+    def request(self, method, url, headers=None, **kwargs):
+        headers = dict(headers or {})
 
         if Settings.get('personal_etm_token'):
             headers['Authorization'] = f"Bearer {Settings.get('personal_etm_token')}"
 
-        return super(SessionWithUrlBase, self).request(
-            method, modified_url, headers=headers, **kwargs)
+        if not self.keep_alive:
+            headers['Connection'] = 'close'
+
+        if self.cache is not None:
+            if method.upper() == 'GET':
+                return self._cached_request(url, headers, **kwargs)
+
+            # The scenario may change, so its validator has to be looked up again
+            scenario = SCENARIO_URL.match(url)
+            if scenario:
+                self._validators.pop(scenario.group(1), None)
+
+        return self._send(method, url, headers, **kwargs)
+
+    def _send(self, method, url, headers, **kwargs):
+        modified_url = self.url_base + url
+
+        if self.request_limit is None:
+            return super(SessionWithUrlBase, self).request(
+                method, modified_url, headers=headers, **kwargs)
+
+        if not kwargs.get('stream'):
+            with self.request_limit:
+                return super(SessionWithUrlBase, self).request(
+                    method, modified_url, headers=headers, **kwargs)
+
+        # The body of a streamed response is read after the request returns, so the
+        # slot is held until the response is closed
+        self.request_limit.acquire()
+        try:
+            response = super(SessionWithUrlBase, self).request(
+                method, modified_url, headers=headers, **kwargs)
+        except BaseException:
+            self.request_limit.release()
+            raise
+
+        return _release_on_close(response, self.request_limit)
+
+    def _cached_request(self, url, headers, **kwargs):
+        '''
+        Answers a GET request from the cache when the cached response is still valid,
+        otherwise sends it and caches the response. Streamed responses are stored
+        in chunks, see ResponseCache.put_streamed.
+        '''
+        key = self._cache_key(url, kwargs.get('params'))
+
+        validator = None
+        scenario = SCENARIO_URL.match(url)
+        if scenario:
+            validator, lookup = self._scenario_validator(scenario.group(1), headers)
+
+            # The request was the lookup of the scenario itself, which is cached already
+            if lookup is not None and key == self._cache_key(f'/scenarios/{scenario.group(1)}'):
+                self.cache.misses += 1
+                return lookup
+
+        entry = self.cache.get(key)
+
+        if entry and validator is not None and entry['validator'] == validator:
+            return self._cache_hit(key, entry)
+
+        if entry and validator is None and entry['etag']:
+            response = self._send('GET', url, {**headers, 'If-None-Match': entry['etag']}, **kwargs)
+            if response.status_code == 304:
+                return self._cache_hit(key, entry)
+        else:
+            response = self._send('GET', url, headers, **kwargs)
+
+        self.cache.misses += 1
+        if response.ok and (validator is not None or response.headers.get('ETag')):
+            if kwargs.get('stream'):
+                return self.cache.put_streamed(key, response, validator)
+
+            self.cache.put(key, response, validator)
+
+        return response
+
+    def _cache_key(self, url, params=None):
+        full_url = requests.Request('GET', self.url_base + url, params=params).prepare().url
+        return ResponseCache.key('GET', full_url, Settings.get('personal_etm_token'))
+
+    def _cache_hit(self, key, entry):
+        self.cache.hits += 1
+        self.cache.touch(key)
+
+        return entry['response']
+
+    def _scenario_validator(self, scenario_id, headers):
+        '''
+        Returns the validator of the cached responses of the scenario: its updated_at,
+        followed by the ETag of the engine when it sends one, or None if it could not
+        be looked up. When the scenario was looked up just now, the response of the
+        lookup is returned with the validator (and cached when it has a validator),
+        otherwise None is.
+        '''
+        if scenario_id in self._validators:
+            return self._validators[scenario_id], None
+
+        url = f'/scenarios/{scenario_id}'
+        response = self._send('GET', url, headers)
+        if not response.ok:
+            return None, response
+
+        parts = [response.json().get('updated_at'), response.headers.get('ETag')]
+        validator = ' '.join(str(part) for part in parts if part) or None
+        self._validators[scenario_id] = validator
+
+        if validator is not None:
+            self.cache.put(self._cache_key(url), response, validator)
+
+        return validator, response
 
 
 class ETM_API(object):
@@ -39,11 +206,15 @@ class ETM_API(object):
     to a single scenario which is identified by the scenario.id. Via the API we
     can request key parameters as shown by the ETM and we can also change
     various input parameters.
+
+    Requests that are sent concurrently run on the executor when one is given,
+    so they share its threads with the caller (see map_concurrently).
     """
 
-    def __init__(self, session, scenario=None):
+    def __init__(self, session, scenario=None, executor=None):
         self.session = session
         self.scenario = scenario
+        self.executor = executor
 
         if self.scenario and not self.scenario.id:
             self.create_etm_scenario()
@@ -57,7 +228,7 @@ class ETM_API(object):
         post_data = {
             "scenario": self.scenario.create_params_as_json()
         }
-        response = self.session.post("/scenarios", json=post_data, headers={'Connection': 'close'})
+        response = self.session.post("/scenarios", json=post_data)
         self.handle_response(response)
         self.scenario.id = response.json()['id']
 
@@ -68,6 +239,36 @@ class ETM_API(object):
             self.scenario.end_year = response.json()['end_year']
 
 
+    def copy_scenario(self, title=None):
+        """
+        Create a new scenario in the ETM that is a copy of the scenario, including
+        its user values. Returns the id of the copy.
+        """
+        post_data = {
+            "scenario": {
+                "scenario_id": self.scenario.id,
+                "title": title if title else self.scenario.title
+            }
+        }
+        response = self.session.post("/scenarios", json=post_data)
+        self.handle_response(response, fail_info=f"Error copying scenario {self.scenario.short_name}")
+
+        return response.json()['id']
+
+
+    def delete_scenario(self):
+        """
+        Delete the scenario from the ETM. Returns False (after a warning) when the
+        engine did not delete it, e.g. because the personal token is not allowed to.
+        """
+        response = self.session.delete(f"/scenarios/{self.scenario.id}")
+
+        if not response.ok:
+            warn(f' Could not delete scenario {self.scenario.id} ({response.status_code})')
+
+        return response.ok
+
+
     # GETTING -----------------------------------------------------------------
 
 
@@ -95,28 +296,83 @@ class ETM_API(object):
         Collect a data download from the ETM. A data download is
         a set of data predefined by the ETM.
         """
-        suffix = f'curves/{download_name}' if hourly else download_name
-        response = self.session.get(f"/scenarios/{self.scenario.id}/{suffix}")
+        response = self.session.get(self._data_download_url(download_name, hourly))
         self.handle_data_download_response(response, download_name)
 
-        return pd.read_csv(io.StringIO(response.content.decode('utf-8')))
+        return pd.read_csv(io.BytesIO(response.content))
+
+
+    def stream_data_download(self, download_name, path, hourly=False):
+        """
+        Stream a data download from the ETM straight to the file at path, without
+        holding it in memory. Only the first chunk of the download is checked.
+        Returns the number of bytes written.
+        """
+        with self.session.get(self._data_download_url(download_name, hourly), stream=True) as response:
+            chunks = response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE)
+            first_chunk = next(chunks, b'')
+            self.handle_data_download_response(response, download_name, first_chunk)
+
+            # Write to a temporary file first, so a failed download leaves no half file
+            part_path = path.with_name(f'{path.name}.part')
+            size = 0
+            try:
+                with open(part_path, 'wb') as f:
+                    for chunk in itertools.chain([first_chunk], chunks):
+                        f.write(chunk)
+                        size += len(chunk)
+            except BaseException:
+                part_path.unlink(missing_ok=True)
+                raise
+
+        os.replace(part_path, path)
+
+        return size
 
 
     def query(self, query_list):
         """
         Perform gqueries on the ETM. Sets the results on the scenario. Returns a pd.DataFrame.
+
+        Query lists longer than query_chunk_size (see settings.yml) are sent in chunks,
+        up to concurrent_query_chunks of them at the same time, and the results are
+        merged in the order of the query list. A chunk with invalid queries is split
+        in halves until those are found, a chunk that fails otherwise (after the
+        retries of the session) fails as a whole. Failed queries are left empty in
+        the results.
         """
-        put_data = {"detailed": True, "gqueries": query_list}
-        response = self.session.put(f'/scenarios/{self.scenario.id}', json=put_data,
-                             headers={'Connection': 'close'})
+        chunks = self._query_chunks(query_list)
 
-        self.handle_response(
-            response,
-            fail_info="Error retrieving queries. Please check your queries file.\n"
-        )
+        if len(chunks) == 1:
+            put_data = {"detailed": True, "gqueries": query_list}
+            response = self.session.put(f'/scenarios/{self.scenario.id}', json=put_data)
 
-        self.scenario.query_results = pd.DataFrame.from_dict(response.json()["gqueries"],
-            orient="index")
+            self.handle_response(
+                response,
+                fail_info="Error retrieving queries. Please check your queries file.\n"
+            )
+
+            return self._set_query_results(response)
+
+        results = {}
+        failed = {}
+        max_workers = Settings.get('concurrent_query_chunks') or 1
+        chunk_outcomes = map_concurrently(self._query_chunk, chunks, max_workers, executor=self.executor)
+        for _, (chunk_results, chunk_failed) in chunk_outcomes:
+            results.update(chunk_results)
+            failed.update(chunk_failed)
+
+        failures = '\n'.join(f'  {query}: {error}' for query, error in failed.items())
+        if not results:
+            exit(f'Error retrieving queries for scenario {self.scenario.short_name}. '
+                 f'Please check your queries file.\n{failures}')
+
+        if failed:
+            warn(f' {len(failed)} queries failed for scenario {self.scenario.short_name} '
+                 f'and are left empty:\n{failures}')
+
+        self.scenario.query_results = pd.DataFrame.from_dict(results, orient='index').reindex(
+            list(dict.fromkeys(query_list)))
 
         return self.scenario.query_results
 
@@ -130,30 +386,49 @@ class ETM_API(object):
         yield from self._get_downloads(download_dict['hourly_data'], hourly=True)
 
 
-    def get_custom_curves(self):
+    def get_custom_curves_list(self):
         '''
-        Get custom curves attached to the scenario.
-        Collects custom curves in one pd.DataFrame output.
-        Internal curves (not visible in the frontend if uploaded) are included.
+        Get the listing of custom curves of the scenario, including internal curves.
+        Returns a list of dicts with (among others) the key of each curve and
+        whether it is attached.
         '''
         response = self.session.get(f"/scenarios/{self.scenario.id}/custom_curves?include_internal=true")
         self.handle_response(
             response,
             fail_info="Error obtaining custom curves.\n")
 
-        # Filter the curve keys attached to the scenario and create dataframe
-        curves_data = json.loads(response.content)
+        return json.loads(response.content)
+
+
+    def get_custom_curves(self):
+        '''
+        Get custom curves attached to the scenario.
+        Collects custom curves in one pd.DataFrame output.
+        Internal curves (not visible in the frontend if uploaded) are included.
+
+        The curves are downloaded concurrently (see concurrent_curve_uploads in
+        settings.yml), and parsed in bulk into one preallocated array.
+        '''
+        # Filter the curve keys attached to the scenario
+        curves_data = self.get_custom_curves_list()
         curves_attached = [curve['key'] for curve in curves_data if curve['attached']]
-        df = pd.DataFrame()
-        for curve in curves_attached:
+        if not curves_attached:
+            return pd.DataFrame()
+
+        values = np.empty((CURVE_LENGTH, len(curves_attached)), order='F')
+
+        def get_curve(column):
+            curve = curves_attached[column]
             response = self.session.get(f"/scenarios/{self.scenario.id}/custom_curves/{curve}.csv")
-            # Decode and obtain float values of curve
-            decoded_response = response.content.decode('utf-8').split('\n')
-            float_values = [float(value) for value in decoded_response]
-            # Add curve to dataframe
-            df[curve] = float_values
+            self.handle_response(response, fail_info=f"Error obtaining custom curve {curve}.\n")
 
-        return df
+            values[:, column] = parse_curve(response.text, curve)
+
+        max_workers = Settings.get('concurrent_curve_uploads') or 1
+        for _ in map_concurrently(get_curve, range(len(curves_attached)), max_workers, executor=self.executor):
+            pass
+
+        return pd.DataFrame(values, columns=curves_attached)
 
 
     def get_custom_orders(self, orders):
@@ -161,16 +436,20 @@ class ETM_API(object):
         Get custom orders for the scenario. Obtains custom orders in one
         string per order type. Returns pd.DataFrame with all custom orders.
         '''
-        df = pd.DataFrame()
-        for order in orders:
+        def get_order(order):
             response = self.session.get(f'/scenarios/{self.scenario.id}/{order}')
             self.handle_response(
                 response,
                 fail_info=f"Error in obtaining custom order for '{order}'")
 
             response_dict = json.loads(response.content.decode('utf-8'))
-            order_string = " ".join(response_dict['order'])
-            df[order] = [order_string]
+            return " ".join(response_dict['order'])
+
+        order_strings = dict(map_concurrently(get_order, orders, len(orders), executor=self.executor))
+
+        df = pd.DataFrame()
+        for order in orders:
+            df[order] = [order_strings[order]]
 
         return df
 
@@ -180,15 +459,22 @@ class ETM_API(object):
         Get the scenario's heat network orders.
         """
         temperature_level = [order.split('_')[-1] for order in heat_orders]
-        df = pd.DataFrame()
-        for t in temperature_level:
+
+        def get_order(t):
             response = self.session.get(f"/scenarios/{self.scenario.id}/heat_network_order", params={"subtype": t})
             self.handle_response(
                 response,
                 fail_info=f"Error in obtaining heat network order for temperature level '{t}'"
             )
             response_dict = json.loads(response.content.decode('utf-8'))
-            df[f'heat_network_order_{t}'] = [' '.join(response_dict['order'])]
+            return ' '.join(response_dict['order'])
+
+        order_strings = dict(
+            map_concurrently(get_order, temperature_level, len(temperature_level), executor=self.executor))
+
+        df = pd.DataFrame()
+        for t in temperature_level:
+            df[f'heat_network_order_{t}'] = [order_strings[t]]
 
         return df.transpose()
 
@@ -196,11 +482,25 @@ class ETM_API(object):
     # UPDATING ----------------------------------------------------------------
 
 
-    def update(self, curve_file_dict):
-        '''Updates everything at once'''
-        self.update_properties()
+    def update(self, curve_file_dict, queries=None):
+        '''
+        Updates everything at once. Returns True when the queries were performed
+        as part of the update.
+
+        When merge_engine_requests is set, the properties and user values are
+        sent in one request. If nothing is uploaded after that request, the
+        queries are sent along as well, so the engine only calculates the
+        scenario once.
+        '''
+        queried = False
+
+        if Settings.get('merge_engine_requests'):
+            queried = bool(queries) and not self._has_uploads() and len(self._query_chunks(queries)) == 1
+            self.update_scenario(queries if queried else None)
+        else:
+            self.update_properties()
+            self._check_and_update_user_values()
 
-        self._check_and_update_user_values()
         self._check_and_update_heat_network()
         self._check_and_update_curves(curve_file_dict)
         self._check_and_update_heat_demand(curve_file_dict)
@@ -208,6 +508,33 @@ class ETM_API(object):
         if self.scenario.flexibility_order:
             warn(" Flexibility order is no longer supported")
 
+        return queried
+
+
+    def update_scenario(self, queries=None):
+        """
+        Update the scenario properties and user values in one request, optionally
+        performing gqueries in the same request. Sets the query results on the
+        scenario when queries are given.
+        """
+        print(" Setting scenario title, description, keep_compatible status and sliders")
+
+        scenario_data = self.scenario.properties_as_json()
+        user_values = self._user_values_to_send() if self.scenario.user_values else {}
+        if user_values:
+            scenario_data['user_values'] = user_values
+
+        put_data = {"scenario": scenario_data}
+        if queries:
+            put_data.update({"detailed": True, "gqueries": queries})
+
+        response = self.session.put(f'/scenarios/{self.scenario.id}', json=put_data)
+
+        self.handle_response(response, fail_info=f"Error for scenario {self.scenario.short_name}")
+
+        if queries:
+            self._set_query_results(response)
+
 
     def update_properties(self):
         """
@@ -218,8 +545,7 @@ class ETM_API(object):
         put_data = {
             "scenario": self.scenario.properties_as_json()
         }
-        response = self.session.put(f"/scenarios/{self.scenario.id}", json=put_data,
-                             headers={'Connection': 'close'})
+        response = self.session.put(f"/scenarios/{self.scenario.id}", json=put_data)
 
         self.handle_response(response)
 
@@ -228,10 +554,17 @@ class ETM_API(object):
         """
         Change inputs to ETM according to dictionary user_values. Also the
         metrics are updated by passing a gquery via gquery_metrics
+
+        When diff_slider_updates is set, only the inputs that differ from the
+        current user values of the scenario are sent, and nothing is sent when
+        none of them changed.
         """
-        put_data = {"scenario": {"user_values": self.scenario.user_values}}
-        response = self.session.put(f'/scenarios/{self.scenario.id}', json=put_data,
-                             headers={'Connection': 'close'})
+        user_values = self._user_values_to_send()
+        if not user_values:
+            return
+
+        put_data = {"scenario": {"user_values": user_values}}
+        response = self.session.put(f'/scenarios/{self.scenario.id}', json=put_data)
 
         self.handle_response(response, fail_info=f"Error for scenario {self.scenario.short_name}")
 
@@ -244,22 +577,62 @@ class ETM_API(object):
             put_data = {"order": order, "subtype": network}
 
             response = self.session.put(f'/scenarios/{self.scenario.id}/heat_network_order',
-                                json=put_data, headers={'Connection': 'close'})
+                                json=put_data)
 
             self.handle_response(response)
 
 
     def upload_custom_curve(self, curve_key, curve_data, curve_file_name):
         """
-        Upload custom curve to ETM
+        Upload custom curve to ETM. Uploads failing with a server error or a timeout
+        are retried by the session. Returns the number of bytes uploaded.
         """
-        curve_string = '\n'.join(str(e) for e in curve_data)
-        put_data = {'file': (curve_file_name, curve_string)}
+        curve_string = serialize_curve(curve_data)
+        self._put_custom_curve(curve_key, curve_string, curve_file_name)
 
-        response = self.session.put(f'/scenarios/{self.scenario.id}/custom_curves/{curve_key}',
-                             files=put_data, headers={'Connection': 'close'})
+        return len(curve_string)
 
-        self.handle_response(response)
+
+    def upload_custom_curves(self, uploads):
+        """
+        Uploads custom curves concurrently, with at most concurrent_curve_uploads
+        (see settings.yml) at the same time. When skip_unchanged_curves is set, curves
+        that are still attached to the scenario as they were uploaded from here, with
+        the same content, are skipped.
+
+        Params:
+            uploads (list[tuple]): (curve_key, curve_data, curve_file_name) for each curve
+        """
+        curves = [(key, serialize_curve(data), file_name) for key, data, file_name in uploads]
+        manifest = CurveManifest.instance() if Settings.get('skip_unchanged_curves') else None
+        if curves and manifest:
+            curves = self._changed_curves(curves)
+
+        max_workers = Settings.get('concurrent_curve_uploads') or 1
+        total_size = 0
+        start = time.perf_counter()
+
+        def upload(curve):
+            curve_key, curve_string, _ = curve
+            curve_start = time.perf_counter()
+            response = self._put_custom_curve(*curve)
+            if manifest:
+                manifest.add(self.session.url_base, self.scenario.id, curve_key,
+                    CurveManifest.fingerprint(curve_string), self._json_or_none(response))
+
+            return len(curve_string), time.perf_counter() - curve_start
+
+        try:
+            uploaded = map_concurrently(upload, curves, max_workers, executor=self.executor)
+            for (curve_key, _, _), (size, duration) in uploaded:
+                total_size += size
+                print(f"  - {curve_key} ({size / 1e3:.1f} kB in {duration:.2f}s)")
+        finally:
+            if curves and manifest: manifest.save()
+
+        if curves:
+            print(f"  Uploaded {len(curves)} curves ({total_size / 1e6:.2f} MB) "
+                  f"in {time.perf_counter() - start:.2f}s")
 
 
     # RESPONSES ---------------------------------------------------------------
@@ -287,27 +660,134 @@ class ETM_API(object):
         exit(fail_info)
 
 
-    def handle_data_download_response(self, response, download_name):
+    def handle_data_download_response(self, response, download_name, first_chunk=None):
+        '''
+        Exits when the download failed. For streamed responses, the first_chunk of
+        the content is checked instead of the full text.
+        '''
         try:
             response.raise_for_status()
         except requests.exceptions.HTTPError as err:
             exit("Something went wrong retrieving a data download. "
                   "Check your data_downloads.csv!\n", err=err)
 
-        if response.text.startswith('<!DOCTYPE html>'):
+        text = response.text if first_chunk is None else first_chunk.decode('utf-8', errors='replace')
+
+        if text.startswith('<!DOCTYPE html>'):
             exit(f'Download "{download_name}" is not available for scenarios '
                     'with Merit turned off. Aborting...\n')
 
+        if not text.split('\n', 1)[0].strip():
+            exit(f'Download "{download_name}" is empty or has no header. Aborting...\n')
+
 
     #  PRIVATE ----------------------------------------------------------------
 
 
+    def _data_download_url(self, download_name, hourly=False):
+        suffix = f'curves/{download_name}' if hourly else download_name
+        return f"/scenarios/{self.scenario.id}/{suffix}"
+
+
     def _get_downloads(self, download_names, hourly=False):
         '''Downloads and yields all requested files'''
         for download in download_names:
             yield (download, self.get_data_download(download, hourly=hourly))
 
 
+    def _user_values_to_send(self):
+        '''Returns the user values that should be sent to the engine'''
+        if not Settings.get('diff_slider_updates'):
+            return self.scenario.user_values
+
+        user_values = user_values_diff(self.scenario.user_values, self.get_scenario_settings())
+        print(f"  {len(user_values)} of {len(self.scenario.user_values)} sliders changed")
+
+        return user_values
+
+
+    def _has_uploads(self):
+        '''True when heat network orders or curves should be uploaded for the scenario'''
+        return bool(
+            self.scenario.heat_network_orders or
+            self.scenario.curve_file or
+            (self.scenario.heat_demand and self.scenario.heat_demand_curves)
+        )
+
+
+    def _query_chunks(self, query_list):
+        '''Splits the query list in chunks of at most query_chunk_size queries'''
+        chunk_size = Settings.get('query_chunk_size')
+        if not chunk_size or len(query_list) <= chunk_size:
+            return [query_list]
+
+        return [query_list[i:i + chunk_size] for i in range(0, len(query_list), chunk_size)]
+
+
+    def _query_chunk(self, chunk):
+        '''
+        Performs one chunk of gqueries. When the engine reports invalid queries, the
+        chunk is split in halves, which are queried separately, until the invalid
+        queries are isolated. Server errors and timeouts are retried by the session,
+        after which all queries of the chunk fail.
+
+        Returns:
+            tuple of the results of each succeeded query (dict), and the error of
+            each failed query (dict)
+        '''
+        response, error = self._put_queries(chunk)
+
+        if response is not None and response.ok:
+            return response.json()['gqueries'], {}
+
+        # These concern the whole scenario, splitting the chunk would not help
+        if response is not None and response.status_code in (403, 404):
+            self.handle_response(response)
+
+        if len(chunk) == 1 or not _reports_invalid_queries(response, error, chunk):
+            return {}, {query: error for query in chunk}
+
+        middle = len(chunk) // 2
+        results, failed = self._query_chunk(chunk[:middle])
+        second_results, second_failed = self._query_chunk(chunk[middle:])
+        results.update(second_results)
+        failed.update(second_failed)
+
+        return results, failed
+
+
+    def _put_queries(self, queries):
+        '''
+        Sends gqueries without exiting on failure. Server errors and timeouts are
+        retried by the session. Returns the response (or None if there was none),
+        and a description of the error if the request failed.
+        '''
+        put_data = {"detailed": True, "gqueries": queries}
+
+        try:
+            response = self.session.put(f'/scenarios/{self.scenario.id}', json=put_data,
+                timeout=Settings.get('query_timeout'))
+        except (requests.exceptions.Timeout, requests.exceptions.ConnectionError) as err:
+            return None, str(err)
+
+        if response.ok:
+            return response, None
+
+        error = f'status {response.status_code}'
+        with suppress(JSONDecodeError, KeyError, TypeError):
+            error = ', '.join(response.json()['errors'])
+
+        return response, error
+
+
+    def _set_query_results(self, response):
+        '''Sets the gquery results in the response on the scenario'''
+        self.scenario.query_results = pd.DataFrame.from_dict(response.json()["gqueries"],
+            orient="index")
+
+        return self.scenario.query_results
+
+
     def _check_and_update_user_values(self):
         '''Checks if user values should be updated, and updates them'''
         if not self.scenario.user_values: return
@@ -330,9 +810,8 @@ class ETM_API(object):
 
         curves = curve_file_dict[self.scenario.curve_file].curves
         print(f" Uploading {len(curves)} custom curves:")
-        for curve in curves:
-            print(f"  - {curve.key}")
-            self.upload_custom_curve(curve.key, curve.data, self.scenario.curve_file)
+        self.upload_custom_curves(
+            [(curve.key, curve.data, self.scenario.curve_file) for curve in curves])
 
 
     def _check_and_update_heat_demand(self, curve_file_dict=None):
@@ -341,21 +820,166 @@ class ETM_API(object):
             return
 
         print(' Generating and uploading weather curves, this may take a while:')
-        if curve_file_dict:
-            for curve_key, curve in curve_file_dict.items():
-
-                if not curve.data.any():
-                    print(f"Curve {curve_key} has no data to upload.") # Final check
-                    continue
-                # Upload each curve
-                self.upload_custom_curve(f'weather/{curve.key}', curve.data, curve.key)
-                print(f"  - Uploaded {curve_key}")
-        else:
-            for curve in self.scenario.heat_demand_curves:
-                if not curve.data.any():
-                    print(f"Curve {curve.key} has no data to upload.")
-                    continue
+        curves = curve_file_dict.values() if curve_file_dict else self.scenario.heat_demand_curves
+
+        uploads = []
+        for curve in curves:
+            if not np.any(curve.data):
+                print(f"Curve {curve.key} has no data to upload.") # Final check
+                continue
+            if not curve_file_dict:
                 curve.to_csv(self.scenario.short_name)
-                # Upload each curve
-                self.upload_custom_curve(f'weather/{curve.key}', curve.data, curve.key)
-                print(f"  - Uploaded {curve.key}")
+
+            uploads.append((f'weather/{curve.key}', curve.data, curve.key))
+
+        self.upload_custom_curves(uploads)
+
+
+    def _put_custom_curve(self, curve_key, curve_string, curve_file_name):
+        '''
+        Uploads a serialized curve. Server errors, connection errors and timeouts are
+        retried by the session (see connection_retries in settings.yml). Returns the
+        response.
+        '''
+        put_data = {'file': (curve_file_name, curve_string)}
+
+        try:
+            response = self.session.put(
+                f'/scenarios/{self.scenario.id}/custom_curves/{curve_key}',
+                files=put_data, timeout=Settings.get('curve_upload_timeout'))
+        except (requests.exceptions.Timeout, requests.exceptions.ConnectionError) as err:
+            exit(f'Could not upload curve {curve_key}.', err=err)
+
+        self.handle_response(response)
+
+        return response
+
+
+    @staticmethod
+    def _json_or_none(response):
+        '''Returns the json content of the response, or None if it has none'''
+        with suppress(JSONDecodeError, ValueError):
+            return response.json()
+
+        return None
+
+
+    def _changed_curves(self, curves):
+        '''
+        Returns the serialized curves that should be uploaded: those that are not
+        attached to the scenario, whose content differs from the last upload, or that
+        were changed on the engine since (their name, size or date in the listing)
+        '''
+        attached = {curve['key']: curve for curve in self.get_custom_curves_list() if curve['attached']}
+        manifest = CurveManifest.instance()
+
+        changed = [
+            (curve_key, curve_string, file_name) for curve_key, curve_string, file_name in curves
+            if not (
+                curve_key in attached and
+                manifest.is_uploaded(self.session.url_base, self.scenario.id, curve_key,
+                    CurveManifest.fingerprint(curve_string), attached[curve_key])
+            )
+        ]
+
+        if len(changed) < len(curves):
+            print(f"  Skipping {len(curves) - len(changed)} unchanged curves")
+
+        return changed
+
+
+def _release_on_close(response, limit):
+    '''
+    Releases the limit once, when the streamed response is closed, its body has been
+    read completely, or it is garbage collected, whichever comes first. The wrappers
+    only hold a weak reference, so a response that is never closed is still collected.
+    '''
+    released = threading.Lock()
+
+    def release():
+        if released.acquire(blocking=False):
+            limit.release()
+
+    finalizer = weakref.finalize(response, release)
+    response_ref = weakref.ref(response)
+    response_class = type(response)
+
+    def close():
+        try:
+            if response_ref() is not None:
+                response_class.close(response_ref())
+        finally:
+            finalizer()
+
+    def iter_content(*args, **kwargs):
+        yield from response_class.iter_content(response_ref(), *args, **kwargs)
+        finalizer()
+
+    response.close = close
+    response.iter_content = iter_content
+
+    return response
+
+
+def _reports_invalid_queries(response, error, queries):
+    '''
+    Returns whether the engine rejected the request because of invalid gqueries: a
+    4xx response with errors that name one of the queries, or mention gqueries
+    '''
+    if response is None or not 400 <= response.status_code < 500:
+        return False
+
+    return 'gquer' in error.lower() or any(query in error for query in queries)
+
+
+def user_values_diff(user_values, current_user_values):
+    '''
+    Returns the user values that should be sent to bring the scenario from its
+    current_user_values to the given user_values: the inputs that are new or
+    have a different value, and the inputs set to 'reset' that currently have
+    a value. Inputs that are not in user_values are left as they are.
+    '''
+    return {
+        key: value for key, value in user_values.items()
+        if (
+            key in current_user_values if _is_reset(value)
+            else key not in current_user_values or not _same_value(value, current_user_values[key])
+        )
+    }
+
+
+def _is_reset(value):
+    return isinstance(value, str) and value.strip().lower() == 'reset'
+
+
+def _same_value(value, other):
+    try:
+        return math.isclose(float(value), float(other), rel_tol=1e-9, abs_tol=1e-12)
+    except (TypeError, ValueError):
+        return str(value) == str(other)
+
+
+def parse_curve(curve_string, curve_key=''):
+    '''
+    Parses a curve with one value per line into a float array in one go. Exits
+    when the curve does not consist of CURVE_LENGTH numbers.
+    '''
+    try:
+        values = np.fromstring(curve_string, sep='\n')
+    except ValueError:
+        values = None
+
+    if values is None or values.size != CURVE_LENGTH:
+        exit(f"Custom curve {curve_key} should consist of {CURVE_LENGTH} numeric values.")
+
+    return values
+
+
+def serialize_curve(curve_data):
+    '''
+    Returns the curve as a string with one value per line, ready for upload.
+    Converting to Python floats (or keeping strings as they are) in bulk is
+    much faster than formatting each NumPy scalar. Values are written as Python
+    writes them, so integers as 1 and floats (including whole ones) as 1.0.
+    '''
+    return '\n'.join(map(str, np.asarray(curve_data).tolist()))
@@ -1,12 +1,18 @@
 import logging
+import time
 from pathlib import Path
+import numpy as np
 import pandas as pd
 
-from helpers.file_helpers import check_duplicate_index, read_csv, check_duplicates, get_folder
+from helpers.file_helpers import (check_duplicate_index, read_csv, check_duplicates, get_folder,
+    output_path, engine_csv_format, output_format, write_output, write_columnar, hourly_dataset_path,
+    DEFAULT_CSV_FORMAT)
 from helpers.heat_demand.weather_years_profile_generator import WeatherYearsGenerator
+from helpers.heat_demand.cache import ProfileCache
 from helpers.heat_file_utils import (contains_building_ag_profiles, load_g2a_parameters, read_building_ag_profiles, read_heat_demand_input, read_profiles,
-    contains_heating_profiles, read_thermostat)
-from helpers.helpers import warn
+    contains_heating_profiles, read_thermostat, contains_curves)
+from helpers.helpers import grouped_output, warn
+from helpers.concurrency import map_concurrently, shared_limit
 from helpers.ETM_API import ETM_API
 from helpers.buildings_profile_helper import BuildingsModel
 from helpers.settings import Settings
@@ -128,14 +134,18 @@ class Scenario:
             therm = self._load_heat_data(read_thermostat, input_folder)
 
         # Initialize the weather years generator with the loaded data
-        generator = WeatherYearsGenerator(temp, irr, wind_speed, therm, parameters)
-        new_profiles = generator.generate_all_profiles()
+        generator = WeatherYearsGenerator(temp, irr, wind_speed, therm, parameters,
+            region=Path(input_folder).name)
+        new_profiles = ProfileCache.instance().fetch(generator)
         for profile in new_profiles:
             self.heat_demand_curves.append(profile)
 
     def _load_heat_data(self, loader_function, input_folder, data_type=None, ):
         file_loc = self._determine_file_loc(loader_function, data_type, input_folder)
-        if file_loc and file_loc.exists():
+        in_store = loader_function == read_heat_demand_input and data_type and \
+            contains_curves(input_folder, [data_type])
+
+        if (file_loc and file_loc.exists()) or in_store:
             try:
                 if data_type is None:
                     data = loader_function(self.heat_demand)
@@ -199,9 +209,36 @@ class Scenario:
         self.api = ETM_API(session, self)
 
 
-    def update(self, curve_file_dict):
-        '''Updates the scenario in ETM'''
-        self.api.update(curve_file_dict)
+    def scratch_copy(self, short_name):
+        '''
+        Returns a new Scenario that is connected to a copy of this scenario in the
+        ETM. Only the basic parameters are copied, so updating the copy does not
+        upload any curves or orders.
+        '''
+        copy = Scenario(pd.Series({
+            'short_name': short_name,
+            'title': self.title,
+            'area_code': self.area_code,
+            'end_year': self.end_year,
+            'keep_compatible': self.keep_compatible
+        }))
+        copy.id = self.api.copy_scenario(title=f'{self.title} ({short_name})' if self.title else short_name)
+        copy.setup_connection(self.api.session)
+
+        return copy
+
+
+    def delete(self):
+        '''Deletes the scenario from the ETM, returns False if that failed'''
+        return self.api.delete_scenario()
+
+
+    def update(self, curve_file_dict, queries=None):
+        '''
+        Updates the scenario in ETM. Returns True when the queries were performed
+        during the update, and the query_results are set.
+        '''
+        return self.api.update(curve_file_dict, queries)
 
 
     def query(self, queries):
@@ -213,6 +250,61 @@ class Scenario:
         yield from self.api.get_data_downloads(downloads)
 
 
+    def export_data_downloads(self, downloads):
+        '''
+        Writes the data downloads to the output folder of the scenario, fetching up
+        to concurrent_downloads of them at the same time. The limit is shared by all
+        scenarios, so it also holds when scenarios are processed concurrently.
+        '''
+        items = (
+            [(name, False) for name in downloads['annual_data']] +
+            [(name, True) for name in downloads['hourly_data']]
+        )
+        max_workers = Settings.get('concurrent_downloads') or 1
+        total_size = 0
+        start = time.perf_counter()
+
+        for (name, _), (size, duration) in map_concurrently(self._export_data_download, items, max_workers):
+            total_size += size
+            print(f"  - {name} ({size / 1e6:.2f} MB in {duration:.2f}s)")
+
+        if items:
+            print(f"  Downloaded {len(items)} files ({total_size / 1e6:.2f} MB) "
+                  f"in {time.perf_counter() - start:.2f}s")
+
+
+    def _export_data_download(self, download):
+        '''
+        Writes one data download to disk. When stream_data_downloads is set and the
+        output CSV format is the same as the format of the engine, the download is
+        streamed straight to disk. Otherwise it is read into a DataFrame and written
+        in the output_format. For parquet and feather, hourly downloads are written
+        to the hourly_data dataset shared by all scenarios.
+        Returns the size of the file and the seconds it took.
+        '''
+        name, hourly = download
+        file_format = output_format()
+
+        with shared_limit('data_downloads', Settings.get('concurrent_downloads') or 1):
+            start = time.perf_counter()
+
+            if file_format == 'csv' and Settings.get('stream_data_downloads') and engine_csv_format():
+                path = output_path(f'{self.short_name}_{name}', self.short_name)
+                size = self.api.stream_data_download(name, path, hourly=hourly)
+            else:
+                data = self.api.get_data_download(name, hourly=hourly)
+
+                if hourly and file_format != 'csv':
+                    path = hourly_dataset_path(name, self.short_name)
+                    write_columnar(data, path, file_format)
+                else:
+                    path = write_output(data, f'{self.short_name}_{name}', folder=self.short_name)
+
+                size = path.stat().st_size
+
+            return size, time.perf_counter() - start
+
+
 class ScenarioCollection:
     def __init__(self, collection):
         self.collection = collection
@@ -257,19 +349,70 @@ class ScenarioCollection:
             scenario.setup_connection(session)
 
 
+    def process(self, process_scenario, max_workers=1):
+        '''
+        Calls process_scenario for each scenario. With more than one worker, up to
+        max_workers scenarios are processed at the same time in a thread pool. The
+        output of each scenario is then printed in one block when it is done.
+        '''
+        if max_workers <= 1:
+            for scenario in self.collection:
+                process_scenario(scenario)
+            return
+
+        def process_grouped(scenario):
+            with grouped_output():
+                process_scenario(scenario)
+
+        for _ in map_concurrently(process_grouped, self.collection, max_workers):
+            pass
+
+
+    def query_all(self, query_list, max_workers=1):
+        '''
+        Queries all scenarios, up to max_workers at the same time, and collects the
+        results in arrays with a row for each query and a column for each scenario.
+        Sets the query_results on each scenario as well. The scenarios are identified
+        by their short names in the outcomes, so these have to be unique.
+
+        Returns:
+            tuple of the future values (np.ndarray), present values (np.ndarray)
+            and the unit of each query (list)
+        '''
+        check_duplicates([str(scenario.short_name) for scenario in self.collection], 'the scenarios',
+            'short name')
+
+        future = np.full((len(query_list), len(self)), np.nan)
+        present = np.full((len(query_list), len(self)), np.nan)
+        units = np.full(len(query_list), None, dtype=object)
+
+        def query(column):
+            scenario = self.collection[column]
+            scenario.query(query_list)
+            results = scenario.query_results.reindex(query_list)
+
+            future[:, column] = results['future'].to_numpy(dtype=float)
+            present[:, column] = results['present'].to_numpy(dtype=float)
+
+            return results['unit'].to_numpy()
+
+        for _, scenario_units in map_concurrently(query, range(len(self)), max_workers):
+            missing = pd.isna(units)
+            units[missing] = scenario_units[missing]
+
+        return future, present, list(units)
+
+
     def query_all_and_export_outcomes(self, queries, target='scenario_outcomes.csv', sections={}):
         '''Queries can be list or dict shortcut to query all and export immedeately'''
         query_list = list(queries.keys()) if isinstance(queries, dict) else queries
 
-        df = pd.DataFrame()
-
-        for scenario in self.collection:
-            scenario.query(query_list)
-            df = scenario.add_results_to_df(df, add_present=False)
+        future, _, units = self.query_all(query_list, Settings.get('concurrent_queries') or 1)
 
-        unit = df.pop('unit')
-        df.loc[:,'Total'] = df.sum(axis=1)
-        df = df.join(unit)
+        df = pd.DataFrame(future, index=query_list,
+            columns=[scenario.short_name for scenario in self.collection])
+        df['Total'] = np.nansum(future, axis=1)
+        df['unit'] = units
 
         if sections:
             df.rename_axis('Subsection', inplace=True)
@@ -282,7 +425,7 @@ class ScenarioCollection:
             df.set_index('Section', append=True, inplace=True)
             df = df.reorder_levels(['Section', 'Subsection'])
 
-        df.to_csv(get_folder('output_file_folder') / target, index=True, header=True)
+        write_output(df, str(Path(target).with_suffix('')), index=True, **DEFAULT_CSV_FORMAT)
 
 
     def export_scenario_outcomes(self, target='scenario_outcomes.csv'):
@@ -295,7 +438,7 @@ class ScenarioCollection:
             df = scenario.add_results_to_df(df)
 
         if not df.empty: df = df.join(df.pop('unit'))
-        df.to_csv(get_folder('output_file_folder') / target, index=True, header=True)
+        write_output(df, str(Path(target).with_suffix('')), index=True, **DEFAULT_CSV_FORMAT)
 
 
     def export_ids(self):
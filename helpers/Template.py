@@ -1,6 +1,11 @@
 import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from helpers.file_helpers import read_csv, check_duplicates, get_folder
+from helpers.concurrency import map_concurrently
+from helpers.ETM_API import ETM_API
+from helpers.file_helpers import (read_csv, check_duplicates, write_output, output_format, output_path,
+    DEFAULT_CSV_FORMAT)
+from helpers.helpers import grouped_output
 
 class Template:
     """
@@ -56,7 +61,8 @@ class Template:
 
     def custom_curves_to_csv(self):
         if not self.custom_curves.empty:
-            self.custom_curves.to_csv(get_folder('output_curves_folder') / f'{self.title}_custom_curves.csv', index=False)
+            write_output(self.custom_curves, f'{self.title}_custom_curves', kind='output_curves_folder',
+                **DEFAULT_CSV_FORMAT)
         else:
             print("No custom curves uploaded for this scenario.")
 
@@ -67,7 +73,8 @@ class Template:
 
     def custom_orders_to_csv(self):
         if not self.custom_orders.empty:
-            self.custom_orders.to_csv(get_folder('output_orders_folder') / f'{self.title}_custom_orders.csv', index=False)
+            write_output(self.custom_orders, f'{self.title}_custom_orders', kind='output_orders_folder',
+                **DEFAULT_CSV_FORMAT)
         else:
             print("No custom orders uploaded for this scenario.")
         
@@ -77,6 +84,42 @@ class Template:
         setattr(self, 'heat_network_orders', heat_network_orders)
 
 
+    def harvest(self, session, complete_mode=False, executor=None):
+        '''
+        Obtains the settings of the template from the ETM. The user values and
+        balanced values come from one request, and in complete mode the heat network
+        orders, custom curves and custom orders are requested at the same time, on
+        the executor when one is given.
+        '''
+        api = ETM_API(session, self, executor=executor)
+        requests = {'info': lambda: api.get_info(detailed=True)}
+
+        if complete_mode:
+            requests.update({
+                'heat_network_orders': lambda: api.get_heat_network_orders(self.heat_orders),
+                'custom_curves': api.get_custom_curves,
+                'custom_orders': lambda: api.get_custom_orders(self.custom_orders)
+            })
+
+        results = dict(
+            map_concurrently(lambda name: requests[name](), requests, len(requests), executor=executor))
+        self.add_user_values(results['info']['user_values'])
+
+        if complete_mode:
+            self.add_balanced_values(results['info']['balanced_values'])
+
+            print('Obtaining heat network orders')
+            self.add_heat_network_orders(results['heat_network_orders'])
+
+            print("Obtaining custom curve CSVs")
+            self.add_custom_curves(results['custom_curves'])
+            self.custom_curves_to_csv()
+
+            print("Obtaining custom orders CSVs")
+            self.add_custom_orders(results['custom_orders'])
+            self.custom_orders_to_csv()
+
+
 class TemplateCollection:
     '''Collection of Templates'''
     def __init__(self, collection):
@@ -87,30 +130,60 @@ class TemplateCollection:
         yield from self.collection
 
 
-    def to_csv(self, file_name, user_values=True):
-        '''Exports the templates to csv'''
-        ids = []
-        titles = []
-        all_keys = []
-        for template in self.collection:
-            value_attribute_dict = template.user_values if user_values else template.balanced_values
-            ids.append(template.id)
-            titles.append(template.title)
-            for input in value_attribute_dict.keys():
-                all_keys.append(input)
-        cols = pd.MultiIndex.from_tuples(zip(titles, ids))
-        unique_keys = list(set(all_keys))
+    def __len__(self):
+        return len(self.collection)
 
-        df = pd.DataFrame(columns=ids, index=unique_keys)
 
-        for template in self.collection:
-            value_attribute_dict = template.user_values if user_values else template.balanced_values
-            template_id = template.id
-            for input_key, val in value_attribute_dict.items():
-                df.loc[input_key, template_id] = val
+    def harvest(self, session, complete_mode=False, max_workers=1):
+        '''
+        Obtains the settings of each template from the ETM. With more than one worker,
+        all templates and their requests share one pool of max_workers threads, and
+        the output of each template is printed in one block when it is done. The
+        order of the collection is kept.
+        '''
+        def harvest(numbered_template, executor=None):
+            index, template = numbered_template
+            print(f"\nProcessing scenario template \"{template.title}\" ({index} of {len(self)} scenarios)")
+            template.harvest(session, complete_mode, executor)
+
+        if max_workers <= 1:
+            for numbered_template in enumerate(self.collection, start=1):
+                harvest(numbered_template)
+            return
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            def harvest_grouped(numbered_template):
+                with grouped_output():
+                    harvest(numbered_template, executor)
+
+            numbered_templates = enumerate(self.collection, start=1)
+            for _ in map_concurrently(harvest_grouped, numbered_templates, max_workers, executor=executor):
+                pass
+
 
-        df.columns = cols
-        df.to_csv(get_folder('output_file_folder') / f'{file_name}.csv', index=True, header=True)
+    def to_csv(self, file_name, user_values=True, chunk_size=None):
+        '''
+        Exports the templates to csv (or the output_format from the settings), with a
+        column for each template and a row for each input, sorted by input key.
+
+        With a chunk_size and csv output, the rows are built and written to disk
+        chunk_size inputs at a time, so the full table is never held in memory.
+        '''
+        values = {
+            template.id: (template.user_values if user_values else template.balanced_values) or {}
+            for template in self.collection
+        }
+        keys = sorted(set().union(*values.values()))
+        columns = pd.MultiIndex.from_tuples([(template.title, template.id) for template in self.collection])
+
+        if not chunk_size or output_format() != 'csv':
+            write_output(self._values_frame(values, keys, columns), file_name, index=True, **DEFAULT_CSV_FORMAT)
+            return
+
+        path = output_path(file_name)
+        for start in range(0, max(len(keys), 1), chunk_size):
+            self._values_frame(values, keys[start:start + chunk_size], columns).to_csv(
+                path, mode='w' if start == 0 else 'a', header=start == 0, **DEFAULT_CSV_FORMAT)
         
 
     def heat_network_orders_to_csv(self):
@@ -119,7 +192,21 @@ class TemplateCollection:
         for template in self.collection:
             df = pd.concat([df, template.heat_network_orders], axis=1)
         df.index.names = ['order']
-        df.to_csv(get_folder('output_orders_folder') / 'heat_network_orders.csv', index=True)
+        write_output(df, 'heat_network_orders', kind='output_orders_folder', index=True, **DEFAULT_CSV_FORMAT)
+
+
+    @staticmethod
+    def _values_frame(values, keys, columns):
+        '''Builds the table of the given input keys in one go from the dict of values per template'''
+        # Object Series keep each value as it was, so integers are not written as floats
+        df = pd.DataFrame(
+            {template_id: pd.Series(template_values, dtype=object)
+             for template_id, template_values in values.items()},
+            index=keys, columns=list(values)
+        )
+        df.columns = columns
+
+        return df
 
 
     @classmethod
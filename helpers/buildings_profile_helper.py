@@ -1,31 +1,12 @@
+import numpy as np
 import pandas as pd
 from pathlib import Path
 from helpers.Curves import Curve
+from helpers.heat_demand.g2a import g2a_heat_demand
 from helpers.settings import Settings
 
 class BuildingsModel:
 
-    def _calculate_heat_demand(self, effective: float, reference: float, slope: float, constant: float) -> float:
-        """Calculates the required heating demand for the hour."""
-        return (reference - effective) * slope + constant if effective < reference else constant
-
-    def _make_parameters(self, effective: pd.Series) -> pd.DataFrame:
-        """Combine effective temperature with reference, slope, and constant parameters."""
-
-        # Ensure reference, slope, and constant all have the same length as effective
-        if not (len(self.reference) == len(self.slope) == len(self.constant) == len(effective)):
-            raise ValueError("The length of 'reference', 'slope', 'constant', and 'effective' must be equal.")
-
-        # Create DataFrame with reference, slope, constant, and effective values
-        parameters = pd.DataFrame({
-            "reference": self.reference,
-            "slope": self.slope,
-            "constant": self.constant,
-            "effective": effective
-        })
-
-        return parameters
-
     def make_heat_demand_profile(self, temperature: pd.Series, wind_speed: pd.Series) -> pd.Series:
         """Generate a heat demand profile for buildings based on temperature and wind speed."""
 
@@ -33,16 +14,12 @@ class BuildingsModel:
         if len(temperature) != 8760 or len(wind_speed) != 8760:
             raise ValueError("Both temperature and wind_speed must have exactly 8760 hourly values.")
 
-        # Effective temperature = temperature - (wind speed / 1.5)
-        effective = temperature - (wind_speed / 1.5)
-        effective = pd.Series(effective, name="effective", dtype=float)
-
-        # Combine effective temperature with G2A parameters
-        profiles = self._make_parameters(effective)
+        # Ensure reference, slope, and constant are either constant or given for each hour
+        if not all(len(np.atleast_1d(param)) in (1, len(temperature))
+                   for param in (self.reference, self.slope, self.constant)):
+            raise ValueError("'reference', 'slope' and 'constant' must be a single value or have the same length as 'temperature'.")
 
-        # Apply the heat demand calculation for each row
-        profile = profiles.apply(lambda row: self._calculate_heat_demand(
-            row["effective"], row["reference"], row["slope"], row["constant"]), axis=1)
+        profile = g2a_heat_demand(temperature, wind_speed, self.reference, self.slope, self.constant)
 
         # Scale the profile and assign it a name
         profile = pd.Series(profile, name="buildings_heating", dtype=float)
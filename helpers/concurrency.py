@@ -0,0 +1,103 @@
+'''Helpers for running I/O bound work, like requests to the engine, concurrently'''
+
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
+
+_shared_limits = {}
+_shared_limits_lock = threading.Lock()
+
+
+def map_concurrently(function, items, max_workers, executor=None):
+    '''
+    Calls function for each item in a pool of max_workers threads, and yields
+    (item, result) tuples in the order in which the calls complete.
+
+    With an executor, the calls run on that pool instead of a new one, so nested
+    maps sharing the executor do not multiply the number of threads. The calling
+    thread then takes on calls as well, at most max_workers at the same time, so
+    a nested map never waits for threads that are waiting for it.
+
+    When one of the calls fails (or exits), the calls that did not start yet
+    are cancelled and the error is raised.
+    '''
+    items = list(items)
+    if not items:
+        return
+
+    if executor is not None:
+        yield from _map_on_executor(function, items, max_workers, executor)
+        return
+
+    executor = ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(items))))
+    try:
+        futures = {executor.submit(function, item): item for item in items}
+        for future in as_completed(futures):
+            yield futures[future], future.result()
+    except BaseException:
+        executor.shutdown(wait=True, cancel_futures=True)
+        raise
+
+    executor.shutdown()
+
+
+def _map_on_executor(function, items, max_workers, executor):
+    '''
+    Runs map_concurrently on a shared executor. The items are taken from a queue by
+    the calling thread and by up to max_workers - 1 helpers submitted to the
+    executor; helpers that only start once the queue is empty return right away.
+    '''
+    pending = queue.SimpleQueue()
+    for item in items:
+        pending.put(item)
+
+    done = queue.SimpleQueue()
+    cancelled = threading.Event()
+
+    def take_one():
+        try:
+            item = pending.get_nowait()
+        except queue.Empty:
+            return False
+
+        try:
+            done.put((item, function(item), None))
+        except BaseException as error:
+            done.put((item, None, error))
+
+        return True
+
+    def work():
+        while not cancelled.is_set() and take_one():
+            pass
+
+    helpers = [executor.submit(work) for _ in range(min(max_workers, len(items)) - 1)]
+    try:
+        for _ in items:
+            # Only wait for calls that are running, never for ones still queued
+            while done.empty() and take_one():
+                pass
+
+            item, result, error = done.get()
+            if error is not None:
+                raise error
+
+            yield item, result
+    finally:
+        # Helpers that did not start are cancelled, those that did finish their call.
+        # Cancelled helpers only count as done once a thread of the executor is free.
+        cancelled.set()
+        wait([helper for helper in helpers if not helper.cancel()])
+
+
+def shared_limit(name, size):
+    '''
+    Returns a semaphore of the given size that is shared by everything using a
+    limit with the same name and size, to bound the number of threads doing the
+    same kind of work at the same time over multiple pools.
+    '''
+    with _shared_limits_lock:
+        if (name, size) not in _shared_limits:
+            _shared_limits[(name, size)] = threading.BoundedSemaphore(max(1, size))
+
+        return _shared_limits[(name, size)]
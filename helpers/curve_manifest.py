@@ -0,0 +1,105 @@
+'''Keeps track of which curves were uploaded to which scenarios'''
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
+from helpers.file_helpers import get_folder
+
+
+class CurveManifest:
+    '''
+    Local manifest of the custom curves uploaded to scenarios, keyed on the engine
+    (its base url), scenario id and curve key. For each upload it holds the content
+    hash of the curve and the metadata the engine listed for the uploaded curve.
+    Used to skip uploading curves that did not change since the last upload, on
+    either side. Shared by all scenarios, use CurveManifest.instance().
+    '''
+    FILE_NAME = 'curve_uploads.json'
+
+    # Metadata in the custom curves listing of the engine that changes with each upload
+    SERVER_FIELDS = ('name', 'size', 'date')
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self, path=None):
+        self.path = path if path is not None else get_folder('curve_manifest_folder') / self.FILE_NAME
+        self.lock = threading.Lock()
+        self.uploads = self._load()
+
+
+    @classmethod
+    def instance(cls):
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls()
+
+        return cls._instance
+
+
+    @staticmethod
+    def fingerprint(curve_string):
+        '''Returns the content hash of a serialized curve'''
+        return hashlib.sha256(curve_string.encode('utf-8')).hexdigest()
+
+
+    @classmethod
+    def server_metadata(cls, listing):
+        '''Returns the metadata of a curve in (or uploaded to) the custom curves listing'''
+        listing = listing if isinstance(listing, dict) else {}
+        return {field: listing.get(field) for field in cls.SERVER_FIELDS}
+
+
+    def is_uploaded(self, engine, scenario_id, curve_key, fingerprint, listing):
+        '''
+        True when a curve with the same content was uploaded to the scenario on the
+        engine before, and the engine still lists the curve as it was uploaded then.
+
+        Params:
+            listing (dict): The entry of the curve in the custom curves listing
+        '''
+        with self.lock:
+            upload = self.uploads.get(engine, {}).get(str(scenario_id), {}).get(curve_key)
+
+        return (
+            upload is not None and
+            upload['fingerprint'] == fingerprint and
+            upload['server'] == self.server_metadata(listing)
+        )
+
+
+    def add(self, engine, scenario_id, curve_key, fingerprint, listing):
+        '''
+        Records an upload. The listing is the entry of the uploaded curve returned
+        by the engine.
+        '''
+        with self.lock:
+            self.uploads.setdefault(engine, {}).setdefault(str(scenario_id), {})[curve_key] = {
+                'fingerprint': fingerprint,
+                'server': self.server_metadata(listing)
+            }
+
+
+    def save(self):
+        '''Writes the manifest to disk'''
+        with self.lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with tempfile.NamedTemporaryFile('w', dir=self.path.parent, suffix='.tmp',
+                                             delete=False) as f:
+                json.dump(self.uploads, f, indent=2, sort_keys=True)
+
+            os.replace(f.name, self.path)
+
+
+    def _load(self):
+        if not self.path.exists():
+            return {}
+
+        try:
+            with open(self.path, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
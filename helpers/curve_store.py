@@ -0,0 +1,293 @@
+'''
+Binary store for many curves in one folder.
+
+All curves are packed into one float64 data file (curves.f64) that is memory-mapped
+when read, so getting a curve does not parse any text. A small JSON index
+(curves.json) names the data file, and maps the key of each curve to its offset
+and length in that file. Text CSVs remain the format for exchanging curves; a
+store can be packed from and unpacked to a folder of single-column CSVs.
+
+Writes to a store are serialized with a lock file (curves.lock), also between
+processes. A data file is only ever appended to, or written under a new name when
+the store is compacted, and the index is replaced atomically after the data is
+written. Readers hold a shared lock while they read the index and map the data
+file, so they always see an index and data file that belong together.
+'''
+import json
+import os
+import re
+import tempfile
+import threading
+from contextlib import contextmanager, suppress
+
+import numpy as np
+import pandas as pd
+
+from helpers.file_helpers import get_folder
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+class CurveStore:
+    '''Memory-mapped float64 curves of one folder, indexed by key'''
+
+    DATA_FILE = 'curves.f64'
+    INDEX_FILE = 'curves.json'
+    LOCK_FILE = 'curves.lock'
+
+    # Data files written by compact are numbered, e.g. curves.2.f64
+    DATA_FILES = re.compile(r'^curves(?:\.(\d+))?\.f64$')
+
+    # Writes to any store are rare and short, one lock keeps the threads of this
+    # process from interleaving them, the lock file keeps other processes out
+    _write_lock = threading.Lock()
+
+    def __init__(self, folder):
+        '''
+        Params:
+            folder (Path): The folder holding the data and index file of the store
+        '''
+        self.folder = folder
+        self.index_path = folder / self.INDEX_FILE
+        self.lock_path = folder / self.LOCK_FILE
+        self._index = None
+        self._data_file = None
+        self._data = None
+
+
+    @classmethod
+    def in_folder(cls, kind, folder=''):
+        '''Returns the store in a subfolder of one of the folders from the settings'''
+        return cls(get_folder(kind) / folder)
+
+
+    @property
+    def data_path(self):
+        '''The data file the index refers to'''
+        if self._index is None:
+            self._open()
+
+        return self.folder / self._data_file
+
+
+    def exists(self):
+        return self.index_path.exists() and self.data_path.exists()
+
+
+    def keys(self):
+        return list(self.index.keys())
+
+
+    def __contains__(self, key):
+        return key in self.index
+
+
+    @property
+    def index(self):
+        '''Dict of key to (offset, length) in the data file, in number of values'''
+        if self._index is None:
+            self._open()
+
+        return self._index
+
+
+    def get(self, key):
+        '''Returns the curve stored under key as a read-only float64 array backed by the file'''
+        offset, length = self.index[key]
+
+        return self._data[offset:offset + length]
+
+
+    def put(self, curves):
+        '''
+        Adds the curves to the store, replacing curves stored under the same key.
+        The values are appended to the data file before the index is replaced, so
+        readers always see a consistent store.
+
+        Params:
+            curves (dict): Curve data (array-like) for each key
+        '''
+        with self._write_lock, self._locked():
+            data_file, index = self._read_index()
+            data_path = self.folder / data_file
+            offset = os.path.getsize(data_path) // 8 if data_path.exists() else 0
+
+            with open(data_path, 'ab') as f:
+                for key, data in curves.items():
+                    values = np.ascontiguousarray(data, dtype='<f8')
+                    f.write(values.tobytes())
+                    index[key] = [offset, len(values)]
+                    offset += len(values)
+
+                f.flush()
+                os.fsync(f.fileno())
+
+            self._write_index(data_file, index)
+            self._close()
+
+
+    def to_dict(self):
+        '''Returns a dict with a copy of each curve in the store'''
+        return {key: np.array(self.get(key)) for key in self.keys()}
+
+
+    def compact(self):
+        '''
+        Rewrites the data without the values of replaced curves, to a new data file.
+        The index is switched to the new file once it is complete, so a crash at any
+        point leaves a consistent store. Old data files are removed afterwards;
+        readers that mapped them before keep their mapping (on Windows, files that
+        are still mapped are removed by the next compact).
+        '''
+        with self._write_lock, self._locked():
+            data_file, index = self._read_index()
+            data = self._map(self.folder / data_file)
+            new_file = self._next_data_file(data_file)
+
+            new_index = {}
+            offset = 0
+            with open(self.folder / new_file, 'wb') as f:
+                for key, (start, length) in index.items():
+                    f.write(np.ascontiguousarray(data[start:start + length]).tobytes())
+                    new_index[key] = [offset, length]
+                    offset += length
+
+                f.flush()
+                os.fsync(f.fileno())
+
+            del data
+            self._write_index(new_file, new_index)
+            self._close()
+
+            for path in self.folder.iterdir():
+                if self.DATA_FILES.match(path.name) and path.name != new_file:
+                    with suppress(OSError):
+                        path.unlink()
+
+
+    @classmethod
+    def from_csv_folder(cls, folder):
+        '''
+        Packs all numeric single-column CSVs in the folder into a store in the same
+        folder, keyed on their file names. Other CSVs, like the thermostat, are
+        skipped. Returns the store.
+        '''
+        curves = {}
+        for path in sorted(folder.glob('*.csv')):
+            data = pd.read_csv(path, header=None)
+            if len(data.columns) != 1:
+                continue
+
+            try:
+                curves[path.stem] = data[0].to_numpy(dtype=np.float64)
+            except ValueError:
+                continue
+
+        store = cls(folder)
+        store.put(curves)
+
+        return store
+
+
+    def to_csv_folder(self, folder=None):
+        '''Writes each curve in the store to a single-column CSV named after its key'''
+        folder = self.folder if folder is None else folder
+        folder.mkdir(parents=True, exist_ok=True)
+
+        for key in self.keys():
+            pd.Series(self.get(key)).to_csv(folder / f'{key}.csv', index=False, header=False)
+
+
+    def _open(self):
+        '''Reads the index and maps the data file, while no other process writes to the store'''
+        with self._locked(shared=True):
+            self._data_file, self._index = self._read_index()
+            self._data = self._map(self.folder / self._data_file)
+
+
+    def _close(self):
+        self._index = None
+        self._data_file = None
+        self._data = None
+
+
+    @staticmethod
+    def _map(path):
+        if not path.exists() or os.path.getsize(path) == 0:
+            return np.empty(0)
+
+        return np.memmap(path, dtype='<f8', mode='r')
+
+
+    def _next_data_file(self, data_file):
+        number = self.DATA_FILES.match(data_file).group(1)
+        return f'curves.{int(number or 0) + 1}.f64'
+
+
+    @contextmanager
+    def _locked(self, shared=False):
+        '''
+        Holds the lock file of the store: shared for readers, exclusive for writers.
+        On Windows, which has no shared locks, readers take it exclusively. Readers
+        of a store that does not exist, or of a folder they can't write the lock
+        file to, read without a lock.
+        '''
+        if shared and not self.index_path.exists():
+            yield
+            return
+
+        try:
+            if not shared:
+                self.folder.mkdir(parents=True, exist_ok=True)
+            lock_file = open(self.lock_path, 'a+b')
+        except OSError:
+            if not shared:
+                raise
+            yield
+            return
+
+        with lock_file:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+                else:
+                    lock_file.seek(0)
+                    msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+    def _read_index(self):
+        '''
+        Returns the name of the data file and the index. Indexes written before
+        compacted stores got numbered data files only hold the curves.
+        '''
+        if not self.index_path.exists():
+            return self.DATA_FILE, {}
+
+        with open(self.index_path, 'r') as f:
+            content = json.load(f)
+
+        if set(content) == {'data_file', 'curves'} and isinstance(content['curves'], dict):
+            return content['data_file'], content['curves']
+
+        return self.DATA_FILE, content
+
+
+    def _write_index(self, data_file, index):
+        with tempfile.NamedTemporaryFile('w', dir=self.folder, suffix='.tmp', delete=False) as f:
+            json.dump({'data_file': data_file, 'curves': index}, f)
+            f.flush()
+            os.fsync(f.fileno())
+
+        os.replace(f.name, self.index_path)
@@ -5,6 +5,13 @@ import yaml
 from .settings import Settings
 from helpers.helpers import warn, exit
 
+# Supported output formats and their file extensions
+OUTPUT_FORMATS = {'csv': 'csv', 'parquet': 'parquet', 'feather': 'feather'}
+
+# Format of the output CSVs that do not follow the csv_separator and decimal_seperator settings
+DEFAULT_CSV_FORMAT = {'sep': ',', 'decimal': '.'}
+
+
 def get_folder(kind):
     '''
     Kind can be input_file_folder, output_file_folder, input_curves_folder, 
@@ -42,12 +49,106 @@ def read_csv(file, sep=Settings.get('csv_separator'), decimal=Settings.get('deci
 
 
 def write_csv(df, name, folder='', sep=Settings.get('csv_separator'), decimal=Settings.get('decimal_seperator'), **options):
-    path = get_folder('output_file_folder') / folder / f'{name}.csv'
-    path.parent.mkdir(parents=True, exist_ok=True)
+    path = output_path(name, folder)
 
     df.to_csv(path, sep=sep, decimal=decimal, **options)
 
 
+def output_path(name, folder='', extension='csv', kind='output_file_folder'):
+    '''Returns the path of an output file, creating its folder if needed'''
+    path = get_folder(kind) / folder / f'{name}.{extension}'
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    return path
+
+
+def output_format():
+    '''Returns the output_format from the settings: csv, parquet or feather'''
+    file_format = str(Settings.get('output_format') or 'csv').lower()
+    if file_format not in OUTPUT_FORMATS:
+        exit(f"Unknown output_format '{file_format}' in the settings. "
+             f"Use one of {', '.join(OUTPUT_FORMATS)}. Aborting...")
+
+    return file_format
+
+
+def write_output(df, name, folder='', kind='output_file_folder', index=False, header=True,
+    sep=None, decimal=None):
+    '''
+    Writes the DataFrame in the output_format from the settings, to {name}.{format}
+    in the folder within the kind folder. CSVs are written with sep and decimal,
+    which default to the csv_separator and decimal_seperator from the settings
+    (pass DEFAULT_CSV_FORMAT to always write ',' and '.'). Parquet and feather files
+    are written with typed columns and the output_compression from the settings.
+    Returns the path.
+    '''
+    file_format = output_format()
+    path = output_path(name, folder, OUTPUT_FORMATS[file_format], kind)
+
+    if file_format == 'csv':
+        df.to_csv(path, sep=sep or Settings.get('csv_separator'),
+            decimal=decimal or Settings.get('decimal_seperator'), index=index, header=header)
+    else:
+        write_columnar(df, path, file_format, index=index)
+
+    return path
+
+
+def write_columnar(df, path, file_format, index=False):
+    '''Writes the DataFrame to path as a parquet or feather file'''
+    df = typed_columns(df.reset_index() if index else df.reset_index(drop=True))
+    compression = Settings.get('output_compression') or 'zstd'
+
+    try:
+        if file_format == 'parquet':
+            df.to_parquet(path, index=False, compression=compression)
+        else:
+            df.to_feather(path, compression=compression)
+    except ImportError as err:
+        exit(f'Writing {file_format} files requires pyarrow. Install it, or set the '
+             'output_format to csv in the settings. Aborting...', err=err)
+
+
+def typed_columns(df):
+    '''
+    Returns a copy of the DataFrame that can be stored in a columnar format: column
+    names are flattened to strings, and object columns become numeric when all of
+    their values are numbers, or strings otherwise.
+    '''
+    df = df.copy()
+    df.columns = [
+        '_'.join(str(level) for level in column) if isinstance(column, tuple) else str(column)
+        for column in df.columns
+    ]
+
+    for column in df.columns[(df.dtypes == object).to_numpy()]:
+        try:
+            df[column] = pd.to_numeric(df[column])
+        except (TypeError, ValueError):
+            df[column] = df[column].astype(str).where(df[column].notna(), None)
+
+    return df
+
+
+def hourly_dataset_path(download_name, scenario_name):
+    '''
+    Returns the path in the hourly_data dataset for an hourly download of a scenario.
+    The dataset is partitioned on download and scenario (hive style). As parquet,
+    all scenarios can be read at once with pd.read_parquet(folder); feather files
+    have to be read one by one (or with pyarrow.dataset).
+    '''
+    return output_path(
+        'data',
+        Path('hourly_data') / f'download={download_name}' / f'scenario={scenario_name}',
+        OUTPUT_FORMATS[output_format()]
+    )
+
+
+def engine_csv_format():
+    '''True when the output CSV format is the same as the format of the CSVs the engine returns'''
+    return Settings.get('csv_separator') == ',' and Settings.get('decimal_seperator') == '.'
+
+
 def read_yml(file):
     with open('config/' + file, 'r') as f:
         doc = yaml.load(f, Loader=yaml.FullLoader)
@@ -0,0 +1,203 @@
+'''
+On-disk cache for generated heat demand profiles.
+
+Generating the profiles for a set of weather curves is deterministic: it only
+depends on the weather inputs, the region (which seeds the smoothing), the
+InsulationConfig constants and the smoothing parameters. The cache stores the
+generated curves in a .npz file named after a hash of all of these, so the
+profiles are only generated again when one of them changes.
+
+The cache is off unless the heat_demand_cache setting is set. Its total size is
+bounded by the heat_demand_cache_size setting (in MB). When it is exceeded, the
+least recently used entries are removed. Profiles are not cached when any of
+them failed to generate.
+'''
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
+import numpy as np
+import pandas as pd
+
+from helpers.Curves import Curve
+from helpers.file_helpers import get_folder
+from helpers.settings import Settings
+
+from . import smoothing
+from .config import insulation_config
+
+# Bump when the way profiles are generated changes, to invalidate old entries
+CACHE_VERSION = 1
+
+DEFAULT_CACHE_SIZE = 500  # MB
+
+
+class ProfileCache:
+    '''Content-addressed cache of heat demand profiles generated by a WeatherYearsGenerator'''
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self, folder=None, max_size=None, enabled=None):
+        '''
+        Params:
+            folder (Path): Where the cache is stored, defaults to the heat_demand_cache_folder setting
+            max_size (float): Maximum size of the cache in MB, defaults to the heat_demand_cache_size setting
+            enabled (bool): Defaults to the heat_demand_cache setting
+        '''
+        self.enabled = bool(Settings.get('heat_demand_cache')) if enabled is None else enabled
+        # Only resolved (and created) when the cache is used
+        self.folder = folder if folder is not None or not self.enabled else get_folder('heat_demand_cache_folder')
+        self.max_size = (
+            max_size if max_size is not None
+            else Settings.get('heat_demand_cache_size') or DEFAULT_CACHE_SIZE
+        ) * 1e6
+
+        self.hits = 0
+        self.misses = 0
+
+
+    @classmethod
+    def instance(cls):
+        '''The cache shared by the whole run, so its hits and misses add up'''
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls()
+
+        return cls._instance
+
+
+    def fetch(self, generator):
+        '''
+        Returns the profiles of the generator from the cache, or generates and
+        caches them when there is no valid entry.
+
+        Params:
+            generator (WeatherYearsGenerator): Generator holding the weather inputs
+
+        Returns:
+            list of Curve objects
+        '''
+        # Legacy seeded profiles depend on what was generated before, so they can't be cached
+        if not self.enabled or Settings.get('legacy_smoothing_seed'):
+            return generator.generate_all_profiles()
+
+        key = self.key(generator)
+        curves = self.get(key)
+
+        if curves is not None:
+            self.hits += 1
+            print(f' Heat demand profiles cache hit ({key[:12]})')
+            return curves
+
+        self.misses += 1
+        print(f' Heat demand profiles cache miss ({key[:12]}), generating profiles')
+
+        curves = generator.generate_all_profiles()
+        if generator.failed_curves:
+            print(f' Not caching the heat demand profiles, as {", ".join(generator.failed_curves)} failed')
+        else:
+            self.put(key, curves)
+
+        return curves
+
+
+    def get(self, key):
+        '''Returns the list of Curves stored under key, or None if there is no valid entry'''
+        path = self._path(key)
+        if not path.exists():
+            return None
+
+        try:
+            with np.load(path) as data:
+                curves = [Curve(curve_key, data[curve_key]) for curve_key in data.files]
+        except (OSError, ValueError):
+            path.unlink(missing_ok=True)
+            return None
+
+        # Mark as recently used
+        os.utime(path)
+
+        return curves
+
+
+    def put(self, key, curves):
+        '''Stores the curves under key, and evicts old entries if the cache grew too large'''
+        if not curves:
+            return
+
+        self.folder.mkdir(parents=True, exist_ok=True)
+
+        # Write to a temporary file first, so concurrent runs never read half a file
+        with tempfile.NamedTemporaryFile(dir=self.folder, suffix='.tmp', delete=False) as f:
+            np.savez(f, **{curve.key: np.asarray(curve.data, dtype=float) for curve in curves})
+
+        os.replace(f.name, self._path(key))
+        self.evict()
+
+
+    def evict(self):
+        '''Removes the least recently used entries until the cache fits within max_size'''
+        entries = sorted(self.folder.glob('*.npz'), key=lambda path: path.stat().st_mtime)
+        total_size = sum(path.stat().st_size for path in entries)
+
+        for path in entries[:-1]:
+            if total_size <= self.max_size:
+                break
+
+            total_size -= path.stat().st_size
+            path.unlink(missing_ok=True)
+
+
+    @staticmethod
+    def key(generator):
+        '''Returns the hash of everything the profiles of the generator depend on'''
+        digest = hashlib.sha256()
+        digest.update(json.dumps(ProfileCache._parameters(generator.region), sort_keys=True).encode())
+
+        for data in (generator.temp, generator.irr, generator.wind_speed, generator.therm,
+                     generator.g2a_params):
+            ProfileCache._update_digest(digest, data)
+
+        return digest.hexdigest()
+
+
+    @staticmethod
+    def _parameters(region):
+        '''The constants and settings the profiles depend on'''
+        return {
+            'version': CACHE_VERSION,
+            'region': region,
+            'r_values': insulation_config.R_VALUES,
+            'surface_area': insulation_config.SURFACE_AREA,
+            'behaviour': insulation_config.BEHAVIOUR_FITTING_RESULTS,
+            'heat_capacity': insulation_config.get_heat_capacity(),
+            'window_area': {
+                house: insulation_config.get_window_area(house)
+                for house in insulation_config.HOUSE_NAMES
+            },
+            'number_of_houses': smoothing.NUMBER_OF_HOUSES,
+            'hours_shifted': smoothing.HOURS_SHIFTED,
+            'interpolation_steps': smoothing.INTERPOLATION_STEPS,
+            'random_seed': smoothing.RANDOM_SEED
+        }
+
+
+    @staticmethod
+    def _update_digest(digest, data):
+        if data is None:
+            digest.update(b'none')
+            return
+
+        if isinstance(data, pd.DataFrame):
+            digest.update(json.dumps([str(column) for column in data.columns]).encode())
+
+        values = np.ascontiguousarray(np.asarray(data, dtype=float))
+        digest.update(str(values.shape).encode())
+        digest.update(values.tobytes())
+
+
+    def _path(self, key):
+        return self.folder / f'{key}.npz'
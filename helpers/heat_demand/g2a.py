@@ -0,0 +1,62 @@
+'''
+Gas-to-heat (G2A) formula for the heat demand of buildings and agriculture.
+
+The heat demand in an hour depends on the effective temperature (the outside
+temperature corrected for wind speed). Below the reference temperature the
+demand increases linearly with the slope, on top of a constant base demand:
+
+    demand = (reference - effective) * slope + constant    if effective < reference
+    demand = constant                                      otherwise
+
+The parameters can be scalars or per-hour curves. The weather curves can be a
+single year, or a 2-D stack of years with the hours along the last axis.
+'''
+import numpy as np
+
+G2A_PARAMETERS = ['reference', 'slope', 'constant']
+
+
+def effective_temperature(temperature, wind_speed):
+    '''Effective temperature = temperature - (wind speed / 1.5)'''
+    return np.asarray(temperature, dtype=float) - np.asarray(wind_speed, dtype=float) / 1.5
+
+
+def g2a_heat_demand(temperature, wind_speed, reference, slope, constant):
+    '''
+    Calculates the (unscaled) heat demand per hour with the G2A formula.
+
+    Params:
+        temperature (array-like): Outside temperature, shape (8760,) or (years, 8760)
+        wind_speed (array-like):  Wind speed, same shape as temperature
+        reference (float or array-like): Reference temperature, scalar or per hour
+        slope (float or array-like):     Slope, scalar or per hour
+        constant (float or array-like):  Constant base demand, scalar or per hour
+
+    Returns:
+        np.array with the heat demand, broadcast to the shape of the weather curves
+    '''
+    effective = effective_temperature(temperature, wind_speed)
+    reference, slope, constant = (
+        np.asarray(param, dtype=float) for param in (reference, slope, constant)
+    )
+
+    return np.where(
+        effective < reference,
+        (reference - effective) * slope + constant,
+        constant
+    )
+
+
+def g2a_parameters(parameters, hours):
+    '''
+    Returns the reference, slope and constant from a G2A parameters pd.DataFrame.
+    Constant parameters (a single row) are returned as scalars, so they are
+    broadcast instead of repeated for every hour.
+    '''
+    if len(parameters) == 1:
+        return tuple(float(parameters[param].iloc[0]) for param in G2A_PARAMETERS)
+
+    if len(parameters) != hours:
+        raise ValueError("G2A parameters length mismatch and not a single constant value.")
+
+    return tuple(parameters[param].to_numpy(dtype=float) for param in G2A_PARAMETERS)
@@ -1,6 +1,15 @@
 '''Refactored code from Dorine (etdataset/curves/demand/households/space_heating/script)'''
+import numpy as np
+
 from .config import insulation_config
 
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+HOURS_PER_DAY = 24
+
 class House:
     """Class to describe a house"""
 
@@ -67,3 +76,128 @@ class House:
             insulation_config.get_surface_area(self.house_type) /
             1000.0
         )
+
+
+class HouseBatch:
+    """
+    Describes a batch of houses that are simulated together. Each hour is one
+    array operation over all houses, which gives the same results as stepping
+    each House by itself.
+    """
+
+    def __init__(self, house_types, insulation_levels, thermostat):
+        houses = [
+            House(house_type, insulation_level, thermostat)
+            for house_type, insulation_level in zip(house_types, insulation_levels)
+        ]
+
+        self.house_types = list(house_types)
+        self.insulation_levels = list(insulation_levels)
+
+        self.heat_capacity = np.array([house.heat_capacity for house in houses])
+        self.energy_exchange_per_delta_T = np.array(
+            [house.energy_exchange_per_delta_T for house in houses])
+        self.window_area = np.array([house.window_area for house in houses])
+
+        # Thermostat settings for each hour of the day (rows) per house (columns)
+        self.thermostat_temperature = np.column_stack([
+            np.asarray(house.thermostat_temperature, dtype=float) for house in houses
+        ])
+        self.inside_temperature = self.thermostat_temperature[0].copy()
+
+
+    def __len__(self):
+        return len(self.heat_capacity)
+
+
+    def calculate_heat_demand(self, outside_temperature, solar_irradiation):
+        '''
+        Simulates the houses for all hours in the given weather curves.
+
+        Params:
+            outside_temperature (array-like): Temperature per hour, either one curve for
+                                              all houses or one column per house
+            solar_irradiation (array-like):   Irradiation per hour in kWh/m2, either one
+                                              curve for all houses or one column per house
+
+        Returns:
+            np.array of shape (hours, number of houses) containing the heat demand
+        '''
+        shape = (len(outside_temperature), len(self))
+        outside_temperature = self._broadcast(outside_temperature, shape)
+        solar_irradiation = self._broadcast(solar_irradiation, shape)
+
+        return _simulate_houses(
+            outside_temperature, solar_irradiation, self.thermostat_temperature,
+            self.heat_capacity, self.energy_exchange_per_delta_T, self.window_area,
+            self.inside_temperature
+        )
+
+
+    @staticmethod
+    def _broadcast(curve, shape):
+        curve = np.asarray(curve, dtype=float)
+        if curve.ndim == 1:
+            curve = curve[:, np.newaxis]
+
+        return np.ascontiguousarray(np.broadcast_to(curve, shape))
+
+
+def _simulate_houses_numpy(outside_temperature, solar_irradiation, thermostat, heat_capacity,
+    energy_exchange_per_delta_T, window_area, inside_temperature):
+    '''
+    Steps all houses through time, one array operation per hour. Follows
+    House.calculate_heat_demand exactly. Updates inside_temperature in place.
+    '''
+    heat_demand = np.zeros(outside_temperature.shape)
+
+    for hour in range(outside_temperature.shape[0]):
+        thermostat_temperature = thermostat[hour % HOURS_PER_DAY]
+        heating = inside_temperature < thermostat_temperature
+
+        heat_demand[hour] = np.where(
+            heating, (thermostat_temperature - inside_temperature) * heat_capacity, 0.0)
+
+        # Update inside temperature if we are heating up
+        np.maximum(inside_temperature, thermostat_temperature, out=inside_temperature)
+
+        energy_leaking = energy_exchange_per_delta_T * (inside_temperature - outside_temperature[hour])
+        energy_added_by_irradiation = solar_irradiation[hour] * window_area
+
+        inside_temperature -= (energy_leaking - energy_added_by_irradiation) / heat_capacity
+
+    return heat_demand
+
+
+def _simulate_houses_loop(outside_temperature, solar_irradiation, thermostat, heat_capacity,
+    energy_exchange_per_delta_T, window_area, inside_temperature):
+    '''
+    Scalar version of _simulate_houses_numpy, only used when it can be compiled
+    by Numba.
+    '''
+    hours, number_of_houses = outside_temperature.shape
+    heat_demand = np.zeros((hours, number_of_houses))
+
+    for hour in range(hours):
+        for house in range(number_of_houses):
+            thermostat_temperature = thermostat[hour % HOURS_PER_DAY, house]
+
+            if inside_temperature[house] < thermostat_temperature:
+                heat_demand[hour, house] = (
+                    (thermostat_temperature - inside_temperature[house]) * heat_capacity[house])
+                inside_temperature[house] = thermostat_temperature
+
+            energy_leaking = energy_exchange_per_delta_T[house] * (
+                inside_temperature[house] - outside_temperature[hour, house])
+            energy_added_by_irradiation = solar_irradiation[hour, house] * window_area[house]
+
+            inside_temperature[house] = inside_temperature[house] - (
+                (energy_leaking - energy_added_by_irradiation) / heat_capacity[house])
+
+    return heat_demand
+
+
+if njit is not None:
+    _simulate_houses = njit(cache=True)(_simulate_houses_loop)
+else:
+    _simulate_houses = _simulate_houses_numpy
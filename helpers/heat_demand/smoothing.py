@@ -1,3 +1,6 @@
+import zlib
+from functools import lru_cache
+
 import numpy as np
 
 """
@@ -21,6 +24,18 @@ random number a curve starts earlier or later than the original curve
 4. The X curves are summed and converted back to a 1 hour interval.
 This results in a curve that represents the aggregated/average heat demand of
 X houses rather than an individual household.
+
+The random numbers do not come from numpy's global random state. Each curve
+is smoothed with either an explicit np.random.Generator, or a seed (by default
+derived from e.g. the region, house type and insulation type). The deviations
+for a seed are drawn once and memoized, so a profile is the same regardless of
+the order in which, or the process in which, it is generated.
+
+The seeded deviations differ from the ones the global random state, seeded
+once with RANDOM_SEED, used to give, so the generated profiles differ from
+those of earlier versions as well. Set legacy_smoothing_seed in settings.yml
+to draw the deviations in call order from one stream seeded like the global
+state was (see legacy_random_state), which reproduces the earlier profiles.
 """
 
 NUMBER_OF_HOUSES = 300
@@ -35,10 +50,30 @@ HOURS_SHIFTED = {
 }
 
 INTERPOLATION_STEPS = 10  # use intervals of 6 minutes when shifting curves
-np.random.seed(1337)  # random seed
+RANDOM_SEED = 1337  # default random seed
+
+# Stream the deviations were drawn from before curves were seeded separately
+_LEGACY_RANDOM_STATE = np.random.RandomState(RANDOM_SEED)
+
+
+def legacy_random_state():
+    '''
+    Returns the np.random.RandomState shared by the whole process, seeded with
+    RANDOM_SEED at import. It draws the same numbers in the same order as the
+    global random state seeded with np.random.seed(RANDOM_SEED) did.
+    '''
+    return _LEGACY_RANDOM_STATE
+
+
+def deviation_seed(*keys):
+    '''
+    Derives a stable random seed from the given keys, e.g.
+    deviation_seed(region, house_type, insulation_type)
+    '''
+    return zlib.crc32('/'.join(str(key) for key in keys).encode('utf-8'))
 
 
-def generate_deviations(size, scale):
+def generate_deviations(size, scale, rng=None):
     '''
     Generate X random numbers with a standard deviation of Y hours
     Round to 1 decimal place and multiply by 10 to get
@@ -47,9 +82,15 @@ def generate_deviations(size, scale):
     compared to the original demand profile.
     E.g. '15' means that the demand profile will be shifted
     forward 1.5 hours, '-10' means it will be shifted backwards 1 hour
+
+    The numbers are drawn from rng, which can be a np.random.Generator, a
+    np.random.RandomState or a seed (defaults to RANDOM_SEED).
     '''
+    if not isinstance(rng, np.random.RandomState):
+        rng = np.random.default_rng(RANDOM_SEED if rng is None else rng)
+
     # generate X random numbers with normal distribution
-    random_numbers = np.random.normal(loc=0.0, scale=scale, size=size)
+    random_numbers = rng.normal(loc=0.0, scale=scale, size=size)
     # round by 1 decimal point
     rounded_numbers = np.round(random_numbers, 1)
     # multiply by 10 to get integer numbers for the deviations
@@ -58,25 +99,47 @@ def generate_deviations(size, scale):
     return shifts.astype(int)
 
 
+@lru_cache(maxsize=None)
+def _memoized_deviations(size, scale, seed):
+    '''Deviations drawn once per (size, scale, seed), read-only as they are shared'''
+    deviations = generate_deviations(size, scale, seed)
+    deviations.setflags(write=False)
+
+    return deviations
+
+
+def deviations_for(insulation_type, rng=None):
+    '''
+    Returns the deviations for NUMBER_OF_HOUSES houses of the insulation type.
+
+    Params:
+        insulation_type (str): low, medium or high
+        rng (np.random.Generator, np.random.RandomState or int): Generator to draw
+            from, or a seed. The deviations for a seed (defaults to RANDOM_SEED)
+            are memoized.
+    '''
+    if isinstance(rng, (np.random.Generator, np.random.RandomState)):
+        return generate_deviations(NUMBER_OF_HOUSES, HOURS_SHIFTED[insulation_type], rng)
+
+    return _memoized_deviations(
+        NUMBER_OF_HOUSES, HOURS_SHIFTED[insulation_type], RANDOM_SEED if rng is None else int(rng))
+
+
 def interpolate(arr, steps):
     '''
     Interpolate the original demand profile
     to allow for smaller intervals than 1
     hour (steps=10 means 6 minute intervals)
-    '''
-    interpolated_arr = []
-    for index, value in enumerate(arr):
-        start = value
-        if index == len(arr)-1:
-            stop = arr[0]
-        else:
-            stop = arr[index+1]
 
-        step_size = (stop - start) / steps
-        for i in range(0, steps):
-            interpolated_arr.append(start + i*step_size)
+    The last hour is interpolated towards the first hour, as the curve is
+    treated as circular. Works along the last axis, so a stack of curves can
+    be interpolated at once.
+    '''
+    arr = np.asarray(arr, dtype=float)
+    step_size = (np.roll(arr, -1, axis=-1) - arr) / steps
+    interpolated_arr = arr[..., np.newaxis] + np.arange(steps) * step_size[..., np.newaxis]
 
-    return interpolated_arr
+    return interpolated_arr.reshape(*arr.shape[:-1], -1)
 
 
 def shift_curve(arr, num):
@@ -85,7 +148,26 @@ def shift_curve(arr, num):
     Example: if num = 5, each element will be shifted 5 places forwards.
     Elements at the end of the array will be put at the front.
     '''
-    return np.roll(arr, num)
+    return np.roll(arr, num, axis=-1)
+
+
+def sum_shifted_curves(arr, deviations):
+    '''
+    Returns the sum of the curve shifted by each of the deviations.
+
+    Equal to summing shift_curve(arr, num) for every num in deviations, but
+    as many houses share the same shift, the deviations are first turned into
+    a histogram of shift counts. Each distinct shift is then rolled only once
+    and weighted by its count (a circular convolution of the curve with the
+    histogram).
+    '''
+    shifts, counts = np.unique(deviations, return_counts=True)
+
+    cumulative_demand = np.zeros(np.shape(arr))
+    for num, count in zip(shifts, counts):
+        cumulative_demand += count * shift_curve(arr, num)
+
+    return cumulative_demand
 
 
 def trim_interpolated(arr, steps):
@@ -98,17 +180,17 @@ def trim_interpolated(arr, steps):
     data point (hour) is the average of 30 minutes before and after the whole
     hour.
     '''
-    arr = shift_curve(arr, INTERPOLATION_STEPS//2)
-    return [sum(arr[i:(i+steps)])/steps for i in range(0, len(arr), steps)]
-
+    arr = shift_curve(np.asarray(arr, dtype=float), INTERPOLATION_STEPS//2)
+    return arr.reshape(*arr.shape[:-1], -1, steps).mean(axis=-1)
 
-def calculate_smoothed_demand(heat_demand, insulation_type):
-    # start out with list of zeroes
-    cumulative_demand = [0]*len(heat_demand)*INTERPOLATION_STEPS
 
+def calculate_smoothed_demand(heat_demand, insulation_type, rng=None):
+    '''
+    Smooths the demand curve of a single house into a neighbourhood curve.
+    rng can be a np.random.Generator or a seed, see deviations_for.
+    '''
     # generate random numbers
-    deviations = generate_deviations(NUMBER_OF_HOUSES,
-                                     HOURS_SHIFTED[insulation_type])
+    deviations = deviations_for(insulation_type, rng)
 
     # interpolate the demand curve to increase the number of data points
     # (i.e. reduce the time interval 1 hour to e.g. 6 minutes)
@@ -117,13 +199,49 @@ def calculate_smoothed_demand(heat_demand, insulation_type):
     # for each random number, shift the demand curve X places forwards or
     # backwards (depending on the number value) and add it to the
     # cumulative demand array
-    for num in deviations:
-        demand_list = shift_curve(interpolated_demand, num)
-        cumulative_demand = [x + y for x, y in zip(cumulative_demand,
-                                                   demand_list)]
+    cumulative_demand = sum_shifted_curves(interpolated_demand, deviations)
 
     # Trim the cumulative demand array such that it has 8760 data points again
     # (hourly intervals instead of 6 minute intervals)
     smoothed_demand = trim_interpolated(cumulative_demand, INTERPOLATION_STEPS)
 
     return smoothed_demand
+
+
+def convolve_shifts(arr, deviations):
+    '''
+    Batch version of sum_shifted_curves: for each curve (row) in arr, returns
+    the sum of the curve shifted by each of the deviations in the matching
+    row of deviations.
+
+    The deviations of each row are turned into a histogram of shift counts,
+    which is applied to its curve as a circular convolution through the FFT.
+    Agrees with sum_shifted_curves within floating point tolerance.
+    '''
+    arr = np.atleast_2d(arr)
+    deviations = np.atleast_2d(deviations)
+    length = arr.shape[-1]
+
+    histogram = np.zeros(arr.shape)
+    rows = np.repeat(np.arange(len(deviations)), deviations.shape[-1])
+    np.add.at(histogram, (rows, deviations.ravel() % length), 1)
+
+    return np.fft.irfft(np.fft.rfft(arr) * np.fft.rfft(histogram), length)
+
+
+def calculate_smoothed_demands(heat_demands, insulation_types, rngs=None):
+    '''
+    Smooths a stack of demand curves (one per row) in one pass. rngs holds a
+    np.random.Generator or a seed for each row. The result equals calling
+    calculate_smoothed_demand for each row.
+    '''
+    rngs = [None] * len(insulation_types) if rngs is None else rngs
+    deviations = np.array([
+        deviations_for(insulation_type, rng)
+        for insulation_type, rng in zip(insulation_types, rngs)
+    ])
+
+    interpolated_demands = interpolate(heat_demands, INTERPOLATION_STEPS)
+    cumulative_demands = convolve_shifts(interpolated_demands, deviations)
+
+    return trim_interpolated(cumulative_demands, INTERPOLATION_STEPS)
@@ -5,9 +5,11 @@ from pathlib import Path
 from helpers.Curves import Curve
 from helpers.settings import Settings
 
-from .house import House
+from .house import HouseBatch
 from .config import insulation_config
-from .smoothing import calculate_smoothed_demand
+from .g2a import G2A_PARAMETERS, g2a_heat_demand, g2a_parameters
+from .smoothing import (calculate_smoothed_demand, calculate_smoothed_demands, deviation_seed,
+    legacy_random_state)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -17,8 +19,11 @@ logger = logging.getLogger(__name__)
 HOURS = 8760
 HOURS_PER_DAY = 24
 
+# Number of weather years generated in one pass by the WeatherYearsBatchGenerator
+DEFAULT_CHUNK_SIZE = 5
+
 class WeatherYearsGenerator:
-    def __init__(self, temp=None, irr=None, wind_speed=None, therm=None, g2a_params=None):
+    def __init__(self, temp=None, irr=None, wind_speed=None, therm=None, g2a_params=None, region=None):
         """
         Initialize the WeatherYearsGenerator with necessary data.
 
@@ -28,12 +33,18 @@ class WeatherYearsGenerator:
             wind_speed (pd.Series): Wind speed curve of length 8760
             therm (pd.DataFrame): Thermostat settings with columns low, medium, high for 24 hours
             g2a_params (pd.DataFrame): G2A parameters with columns reference, slope, constant
+            region (str): Name of the region, used with the house and insulation type to
+                          seed the smoothing of the house profiles
         """
         self.temp = temp.reset_index(drop=True) if temp is not None else None
         self.irr = irr.reset_index(drop=True) if irr is not None else None
         self.wind_speed = wind_speed.reset_index(drop=True) if wind_speed is not None else None
         self.therm = therm if therm is not None else None
         self.g2a_params = g2a_params if g2a_params is not None else None
+        self.region = region
+
+        # Names of the curves that failed in the last generate_all_profiles
+        self.failed_curves = []
 
         # Flags to determine which profiles can be generated
         self.can_generate_house = True
@@ -66,12 +77,13 @@ class WeatherYearsGenerator:
         if self.wind_speed is not None and len(self.wind_speed) != HOURS:
             raise ValueError("Wind speed data must have exactly 8760 hourly values.")
         if self.g2a_params is not None:
-            if not all(col in self.g2a_params.columns for col in ['reference', 'slope', 'constant']):
+            if not all(col in self.g2a_params.columns for col in G2A_PARAMETERS):
                 raise ValueError("G2A parameters must include 'reference', 'slope', and 'constant' columns.")
 
     def generate_all_profiles(self):
         """Generate heat demand profiles for houses, buildings, and agriculture."""
         curves = []
+        self.failed_curves = []
 
         if self.can_generate_house:
             logger.info("Generating house heat demand profiles...")
@@ -103,57 +115,63 @@ class WeatherYearsGenerator:
 
         irr_kwh_m2 = insulation_config.from_J_cm2_to_Kwh_m2(self.irr)
 
+        combinations = [
+            (house_type, insulation_type)
+                for house_type in insulation_config.HOUSE_NAMES
+                for insulation_type in insulation_config.INSULATION_TYPES
+        ]
+        heat_demand = self._heat_demand_curves(combinations, self.temp, irr_kwh_m2, self.therm)
+
         curves = []
-        for house_type in insulation_config.HOUSE_NAMES:
-            for insulation_type in insulation_config.INSULATION_TYPES:
-                curve_name = f'insulation_{house_type}_{insulation_type}'
-                try:
-                    demand_curve = self._heat_demand_curve(house_type, insulation_type, self.temp, irr_kwh_m2, self.therm)
-                    curves.append(Curve(curve_name, demand_curve))
-                    logger.debug(f"Generated curve: {curve_name}")
-                except Exception as e:
-                    logger.error(f"Failed to generate curve {curve_name}: {e}")
+        for index, (house_type, insulation_type) in enumerate(combinations):
+            curve_name = f'insulation_{house_type}_{insulation_type}'
+            try:
+                demand_curve = self._smoothe_and_aggregate(
+                    heat_demand[:, index], insulation_type, self._smoothing_seed(house_type, insulation_type))
+                curves.append(Curve(curve_name, demand_curve))
+                logger.debug(f"Generated curve: {curve_name}")
+            except Exception as e:
+                logger.error(f"Failed to generate curve {curve_name}: {e}")
+                self.failed_curves.append(curve_name)
         return curves
 
-    def _heat_demand_curve(self, house_type, insulation_type, temp, irr, therm):
+    def _heat_demand_curves(self, combinations, temp, irr, therm):
         """
-        Calculates the heat demand curve for a house and insulation type.
+        Calculates the individual heat demand curves for all house and insulation
+        type combinations at once.
 
         Returns:
-            np.array of length 8760 containing the heat demand curve
+            np.array of shape (8760, number of combinations) containing the heat demand curves
         """
-        house = House(house_type, insulation_type, therm)
-        heat_demand = np.array([
-            self._heat_demand_at_hour(house, hour, temp, irr)
-            for hour in range(HOURS)
-        ])
-        return self._smoothe_and_aggregate(heat_demand, insulation_type)
+        house_types, insulation_types = zip(*combinations)
+        houses = HouseBatch(house_types, insulation_types, therm)
+        return houses.calculate_heat_demand(temp, irr)
 
-    def _heat_demand_at_hour(self, house, hour, temp, irr):
+    def _smoothing_seed(self, house_type, insulation_type):
         """
-        Calculates the heat demand for the house type at the specified hour.
-
-        Returns:
-            float value of heat demand
+        Random seed for smoothing the profile of the house and insulation type in this region.
+        With legacy_smoothing_seed set, the shared legacy stream is returned instead.
         """
-        # Hour of the day (0 to 23)
-        hour_of_the_day = hour % HOURS_PER_DAY
-        return house.calculate_heat_demand(temp[hour], irr[hour], hour_of_the_day)
+        if Settings.get('legacy_smoothing_seed'):
+            return legacy_random_state()
+
+        return deviation_seed(self.region, house_type, insulation_type)
 
-    def _smoothe_and_aggregate(self, curve, insulation_type):
+    def _smoothe_and_aggregate(self, curve, insulation_type, seed=None):
         """
         Smooth demand curve to turn individual household curves into average/aggregate
         curves of a whole neighbourhood.
         """
-        smoothed_curve = calculate_smoothed_demand(curve, insulation_type)
+        smoothed_curve = calculate_smoothed_demand(curve, insulation_type, seed)
         return self._normalize(smoothed_curve)
 
     def _normalize(self, curve):
-        """Normalizes a curve to sum up to 1/3600."""
-        total = np.sum(curve)
-        if total == 0:
+        """Normalizes a curve, or each curve in a stack of curves, to sum up to 1/3600."""
+        curve = np.asarray(curve, dtype=float)
+        total = np.sum(curve, axis=-1, keepdims=True)
+        if np.any(total == 0):
             logger.warning("Total heat demand is zero during normalization.")
-            return curve
+            return np.where(total == 0, curve, curve / np.where(total == 0, 1, total) / 3600)
         return curve / total / 3600
 
     def generate_building_agriculture_profiles(self):
@@ -173,42 +191,169 @@ class WeatherYearsGenerator:
             return [building_curve, agriculture_curve]
         except Exception as e:
             logger.error(f"Failed to generate building/agriculture profiles: {e}")
+            self.failed_curves.extend(["buildings_heating", "agriculture_heating"])
             return []
 
     def _make_heat_demand_profile(self, temperature, wind_speed):
         """Generate a heat demand profile for buildings based on temperature and wind speed."""
-        # Effective temperature = temperature - (wind speed / 1.5)
-        effective_temp = temperature - (wind_speed / 1.5)
-
-        # Ensure G2A parameters are aligned
-        if len(self.g2a_params) != HOURS:
-            # If parameters are constants, repeat them
-            if len(self.g2a_params) == 1:
-                parameters = self.g2a_params.iloc[0].to_dict()
-                parameters_df = pd.DataFrame([parameters] * HOURS)
-                logger.debug("G2A parameters are constants; repeating for all hours.")
-            else:
-                raise ValueError("G2A parameters length mismatch and not a single constant value.")
-        else:
-            parameters_df = self.g2a_params.reset_index(drop=True)
+        reference, slope, constant = g2a_parameters(self.g2a_params, HOURS)
+        profile = g2a_heat_demand(temperature, wind_speed, reference, slope, constant)
 
-        # Combine effective temperature with G2A parameters
-        parameters_df['effective'] = effective_temp.values
+        # Normalize the profile
+        return self._normalize(profile)
 
-        # Apply the heat demand calculation
-        profile = parameters_df.apply(
-            lambda row: self._calculate_building_heat_demand(
-                row['effective'], row['reference'], row['slope'], row['constant']
-            ), axis=1
+
+class WeatherYearsBatchGenerator(WeatherYearsGenerator):
+    """
+    Generates the heat demand profiles for many weather years at once. The
+    years are processed in chunks; within a chunk all house and building
+    profiles of all years are generated in one vectorized pass. The chunk size
+    bounds the peak memory use.
+    """
+
+    def __init__(self, temp=None, irr=None, wind_speed=None, therm=None, g2a_params=None, region=None,
+        chunk_size=None):
+        """
+        Initialize the WeatherYearsBatchGenerator with necessary data.
+
+        Params:
+            temp (pd.DataFrame or np.array): Outside temperature curves of shape (years, 8760).
+                                             The index of a pd.DataFrame is used as the years.
+            irr (pd.DataFrame or np.array): Solar irradiation curves of shape (years, 8760)
+            wind_speed (pd.DataFrame or np.array): Wind speed curves of shape (years, 8760)
+            therm (pd.DataFrame): Thermostat settings with columns low, medium, high for 24 hours
+            g2a_params (pd.DataFrame): G2A parameters with columns reference, slope, constant
+            region (str): Name of the region, used with the house and insulation type to
+                          seed the smoothing of the house profiles
+            chunk_size (int): Number of years generated per pass. Defaults to the
+                              weather_years_chunk_size setting.
+        """
+        temp, irr, wind_speed = (self._stack(curves) for curves in (temp, irr, wind_speed))
+
+        self.years = temp.index.tolist() if temp is not None else []
+        self.chunk_size = int(
+            chunk_size or Settings.get('weather_years_chunk_size') or DEFAULT_CHUNK_SIZE)
+
+        super().__init__(temp, irr, wind_speed, therm, g2a_params, region)
+
+    @staticmethod
+    def _stack(curves):
+        """Returns the curves as a pd.DataFrame with one row per year."""
+        if curves is None or isinstance(curves, pd.DataFrame):
+            return curves
+
+        return pd.DataFrame(np.atleast_2d(np.asarray(curves, dtype=float)))
+
+    def validate_inputs(self):
+        """Ensure that all input data have 8760 values for each year."""
+        shape = (len(self.years), HOURS)
+        if self.temp is not None and self.temp.shape != shape:
+            raise ValueError("Temperature data must have exactly 8760 hourly values for each year.")
+        if self.irr is not None and self.irr.shape != shape:
+            raise ValueError("Irradiation data must have exactly 8760 hourly values for each year.")
+        if self.wind_speed is not None and self.wind_speed.shape != shape:
+            raise ValueError("Wind speed data must have exactly 8760 hourly values for each year.")
+        if self.g2a_params is not None:
+            if not all(col in self.g2a_params.columns for col in G2A_PARAMETERS):
+                raise ValueError("G2A parameters must include 'reference', 'slope', and 'constant' columns.")
+
+    def generate_all_profiles(self):
+        """
+        Generate heat demand profiles for houses, buildings, and agriculture for
+        each weather year.
+
+        Returns:
+            dict of {year: list of Curve objects}
+        """
+        profiles = {year: [] for year in self.years}
+
+        if not self.can_generate_house:
+            logger.info("Skipping house heat demand profiles generation due to missing data.")
+        if not self.can_generate_buildings_agriculture:
+            logger.info("Skipping building and agriculture heat demand profiles generation due to missing data.")
+
+        for start in range(0, len(self.years), self.chunk_size):
+            chunk = slice(start, start + self.chunk_size)
+            years = self.years[chunk]
+            logger.info(f"Generating heat demand profiles for weather years {years[0]} to {years[-1]}...")
+
+            if self.can_generate_house:
+                for year, curves in zip(years, self._house_profiles_for_years(chunk)):
+                    profiles[year].extend(curves)
+
+            if self.can_generate_buildings_agriculture:
+                for year, curves in zip(years, self._building_agriculture_profiles_for_years(chunk)):
+                    profiles[year].extend(curves)
+
+        return profiles
+
+    def generate_house_profiles(self):
+        """Generates the house profiles. Returns a dict of {year: list of Curve objects}"""
+        return self._generate_per_year(self._house_profiles_for_years)
+
+    def generate_building_agriculture_profiles(self):
+        """Generates the building and agriculture profiles. Returns a dict of {year: list of Curve objects}"""
+        return self._generate_per_year(self._building_agriculture_profiles_for_years)
+
+    def _generate_per_year(self, generate_chunk):
+        """Calls generate_chunk for each chunk of years and collects the curves by year."""
+        profiles = {}
+        for start in range(0, len(self.years), self.chunk_size):
+            chunk = slice(start, start + self.chunk_size)
+            profiles.update(zip(self.years[chunk], generate_chunk(chunk)))
+
+        return profiles
+
+    def _house_profiles_for_years(self, chunk):
+        """
+        Generates the house profiles for the years in the chunk in one pass.
+
+        Returns:
+            list with a list of Curve objects for each year in the chunk
+        """
+        temp = self.temp.to_numpy(dtype=float)[chunk]
+        irr = insulation_config.from_J_cm2_to_Kwh_m2(self.irr.to_numpy(dtype=float)[chunk])
+        number_of_years = len(temp)
+
+        combinations = [
+            (house_type, insulation_type)
+                for house_type in insulation_config.HOUSE_NAMES
+                for insulation_type in insulation_config.INSULATION_TYPES
+        ]
+        house_types, insulation_types = zip(*(combinations * number_of_years))
+
+        # One column per year and combination, ordered by year
+        houses = HouseBatch(house_types, insulation_types, self.therm)
+        heat_demand = houses.calculate_heat_demand(
+            np.repeat(temp.T, len(combinations), axis=1),
+            np.repeat(irr.T, len(combinations), axis=1)
         )
 
-        # Normalize the profile
-        profile = self._normalize(profile)
-        return profile.values  # Ensure it's a NumPy array
+        seeds = [self._smoothing_seed(*combination) for combination in combinations] * number_of_years
+        smoothed = calculate_smoothed_demands(heat_demand.T, insulation_types, seeds)
+        profiles = self._normalize(smoothed).reshape(number_of_years, len(combinations), HOURS)
 
-    def _calculate_building_heat_demand(self, effective, reference, slope, constant):
-        """Calculates the required heating demand for buildings."""
-        if effective < reference:
-            return (reference - effective) * slope + constant
-        else:
-            return constant
+        return [
+            [
+                Curve(f'insulation_{house_type}_{insulation_type}', profile)
+                for (house_type, insulation_type), profile in zip(combinations, year_profiles)
+            ]
+            for year_profiles in profiles
+        ]
+
+    def _building_agriculture_profiles_for_years(self, chunk):
+        """
+        Generates the building and agriculture profiles for the years in the chunk in one pass.
+
+        Returns:
+            list with a list of Curve objects for each year in the chunk
+        """
+        profiles = self._make_heat_demand_profile(
+            self.temp.to_numpy(dtype=float)[chunk],
+            self.wind_speed.to_numpy(dtype=float)[chunk]
+        )
+
+        return [
+            [Curve("buildings_heating", profile), Curve("agriculture_heating", profile.copy())]
+            for profile in profiles
+        ]
@@ -1,14 +1,20 @@
 '''Utils for file reading/writing for heat demend'''
 
 from helpers.file_helpers import read_csv, get_folder
-from helpers.helpers import exit
+from helpers.helpers import exit, warn
+from helpers.settings import Settings
 from helpers.heat_demand.config import insulation_config
+from helpers.heat_demand.weather_years_profile_generator import WeatherYearsBatchGenerator
 from helpers.Curves import Curve
+from helpers.curve_store import CurveStore
 import pandas as pd
 
 def read_heat_demand_input(folder, file):
     '''
-    Reads a file into a pd.Series from a folder located in data/input/curves
+    Reads a file into a pd.Series from a folder located in data/input/curves. When
+    the folder has a curve store containing the curve, it is read from the store
+    instead of the csv if curve_store is set (see settings.yml), if there is no csv,
+    or if the store was written after the csv was last changed.
 
     Params:
         folder (str): The folder inside data/input/curves (see settings.yml)
@@ -17,14 +23,47 @@ def read_heat_demand_input(folder, file):
     Returns:
         pd.Series containing the curve in the file
     '''
-    curve = read_csv(f'{folder}/{file}', curve=True, silent=True,
-        header=None).squeeze('columns').astype(float)
+    store = input_store(folder)
+    if file in store and use_store(store, get_folder('input_curves_folder') / folder / f'{file}.csv'):
+        curve = pd.Series(store.get(file))
+    else:
+        curve = read_csv(f'{folder}/{file}', curve=True, silent=True,
+            header=None).squeeze('columns').astype(float)
 
     if not curve.size == 8760:
         exit(f'Curve input {file} in {folder} should be of length 8760')
 
     return curve
 
+def input_store(folder):
+    '''Returns the CurveStore of a folder inside data/input/curves'''
+    return CurveStore.in_folder('input_curves_folder', folder)
+
+def use_store(store, csv_path):
+    '''
+    Checks if a curve in the store should be read instead of its csv. Warns when
+    the store is used while the csv was changed after the store was written.
+    '''
+    if not csv_path.exists():
+        return True
+
+    store_is_newer = store.index_path.stat().st_mtime >= csv_path.stat().st_mtime
+    if not Settings.get('curve_store'):
+        return store_is_newer
+
+    if not store_is_newer:
+        warn(f'{csv_path.name} was changed after the curve store in {csv_path.parent} was written. '
+             'Reading the curve from the store, pack the folder again to use the csv.')
+
+    return True
+
+def contains_curves(folder, curve_keys):
+    '''Checks if all curves are in the folder, as csv or in its curve store'''
+    path = get_folder('input_curves_folder') / folder
+    store = input_store(folder)
+
+    return all((path / f'{curve_key}.csv').exists() or curve_key in store for curve_key in curve_keys)
+
 def read_thermostat(folder):
     '''
     Reads the thermostat file into a pd.DataFrame, amd performs some checks
@@ -49,12 +88,7 @@ def contains_heating_profiles(folder):
     Returns:
         bool
     '''
-    path = get_folder('input_curves_folder') / folder
-    for curve_key in insulation_config.curve_keys:
-        if not (path / f'{curve_key}.csv').exists():
-            return False
-
-    return True
+    return contains_curves(folder, insulation_config.curve_keys)
 
 def read_building_ag_profiles(folder):
     curve_keys = ["buildings_heating", "agriculture_heating"]
@@ -62,12 +96,7 @@ def read_building_ag_profiles(folder):
         yield Curve(curve_key, read_heat_demand_input(folder, curve_key))
 
 def contains_building_ag_profiles(folder):
-    curve_keys = ["buildings_heating", "agriculture_heating"]
-    path = get_folder('input_curves_folder') / folder
-    for curve_key in curve_keys:
-        if not (path / f'{curve_key}.csv').exists():
-            return False
-    return True
+    return contains_curves(folder, ["buildings_heating", "agriculture_heating"])
 
 def read_profiles(folder):
     '''
@@ -97,3 +126,64 @@ def load_g2a_parameters(folder):
     if not filepath.exists():
         raise FileNotFoundError(f"G2A_parameters.csv not found in {path}")
     return pd.read_csv(filepath)
+
+def read_weather_years(folder, file):
+    '''
+    Reads all year-suffixed versions of a weather file, e.g. temperature_1987.csv,
+    temperature_1988.csv, etc.
+
+    Params:
+        folder (str): The folder inside data/input/curves (see settings.yml)
+        file (str): The file stem without the year suffix, e.g. 'temperature'
+
+    Returns:
+        pd.DataFrame with one row of 8760 values for each year, indexed by year
+    '''
+    path = get_folder('input_curves_folder') / folder
+    stems = {file_path.stem for file_path in path.glob(f'{file}_*.csv')}
+    stems.update(key for key in input_store(folder).keys() if key.startswith(f'{file}_'))
+
+    curves = {}
+    for stem in stems:
+        year = stem[len(file) + 1:]
+        if year.isdigit():
+            curves[int(year)] = read_heat_demand_input(folder, stem).to_numpy()
+
+    return pd.DataFrame.from_dict(curves, orient='index').sort_index()
+
+def load_weather_years(folder, chunk_size=None):
+    '''
+    Creates a WeatherYearsBatchGenerator from a folder with year-suffixed temperature,
+    irradiation and wind_speed files. The thermostat and G2A_parameters files are
+    shared by all years.
+
+    Params:
+        folder (str): The folder inside data/input/curves (see settings.yml)
+        chunk_size (int): Number of years generated per pass (optional)
+
+    Returns:
+        WeatherYearsBatchGenerator
+    '''
+    path = get_folder('input_curves_folder') / folder
+    weather = {
+        file: read_weather_years(folder, file) for file in ['temperature', 'irradiation', 'wind_speed']
+    }
+
+    if weather['temperature'].empty:
+        exit(f'No year-suffixed temperature files (e.g. temperature_1987.csv) found in {folder}')
+
+    for file, curves in weather.items():
+        if curves.empty:
+            weather[file] = None
+        elif not curves.index.equals(weather['temperature'].index):
+            exit(f'Weather years in {file} do not match the temperature years in {folder}')
+
+    return WeatherYearsBatchGenerator(
+        weather['temperature'],
+        weather['irradiation'],
+        weather['wind_speed'],
+        read_thermostat(folder) if (path / 'thermostat.csv').exists() else None,
+        load_g2a_parameters(folder) if (path / 'G2A_parameters.csv').exists() else None,
+        region=path.name,
+        chunk_size=chunk_size
+    )
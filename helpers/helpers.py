@@ -1,5 +1,11 @@
 '''Helpers for parsing commandline arguments and communicating with user'''
 
+import io
+import logging
+import sys
+import threading
+from contextlib import contextmanager
+
 from .settings import Settings
 
 BETA = ['beta', 'staging']
@@ -9,6 +15,7 @@ PRO = ['pro', 'production']
 QUERY_ONLY = ['query_only', 'query-only', 'query', 'read_only', 'read-only',
     'read', 'results_only', 'results-only', 'results']
 COMPLETE = ['complete', 'Complete', 'compleet', 'Compleet']
+NO_CACHE = ['--no-cache', 'no-cache', 'no_cache']
 
 # PRINTING --------------------------------------------------------------------
 
@@ -31,6 +38,103 @@ def print_bold(*text, **options):
     print(f'\033[1m{" ".join(text)}\033[0m', **options)
 
 
+class _ThreadOutput:
+    '''
+    Stands in for sys.stdout, or the stream of a logging handler. Text written by
+    a thread that is grouping its output is written to that thread's buffer,
+    everything else goes to the original stream.
+    '''
+    captured = threading.local()
+    lock = threading.Lock()
+
+    # Number of threads grouping their output, and the streams replaced meanwhile
+    installed = 0
+    install_lock = threading.Lock()
+    replaced = None
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    def write(self, text):
+        buffer = getattr(self.captured, 'buffer', None)
+        return (buffer if buffer is not None else self.stream).write(text)
+
+    def flush(self):
+        self.stream.flush()
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+    @classmethod
+    def install(cls):
+        '''Routes sys.stdout and the logging stream handlers through a _ThreadOutput'''
+        with cls.install_lock:
+            cls.installed += 1
+            if cls.installed > 1:
+                return
+
+            cls.replaced = {'stdout': sys.stdout, 'handlers': {}}
+            sys.stdout = cls(sys.stdout)
+
+            for handler in _stream_handlers():
+                cls.replaced['handlers'][handler] = handler.setStream(cls(handler.stream))
+
+    @classmethod
+    def uninstall(cls):
+        '''Restores the original streams once no thread is grouping its output'''
+        with cls.install_lock:
+            cls.installed -= 1
+            if cls.installed > 0:
+                return
+
+            sys.stdout = cls.replaced['stdout']
+            for handler, stream in cls.replaced['handlers'].items():
+                handler.setStream(stream)
+
+            cls.replaced = None
+
+
+def _stream_handlers():
+    '''The handlers of all loggers that write to a stream (but not to a file)'''
+    loggers = [logging.getLogger()] + [
+        logger for logger in logging.Logger.manager.loggerDict.values()
+        if isinstance(logger, logging.Logger)
+    ]
+
+    return {
+        handler for logger in loggers for handler in logger.handlers
+        if isinstance(handler, logging.StreamHandler) and not isinstance(handler, logging.FileHandler)
+    }
+
+
+@contextmanager
+def grouped_output():
+    '''
+    Collects everything printed or logged by the current thread and prints it in
+    one go when done, so the output of tasks running at the same time does not
+    interleave. The original sys.stdout and logging streams are restored when no
+    thread is grouping its output anymore. Nested groups join the outer group.
+    '''
+    if getattr(_ThreadOutput.captured, 'buffer', None) is not None:
+        yield
+        return
+
+    _ThreadOutput.install()
+    stream = _ThreadOutput.replaced['stdout']
+    _ThreadOutput.captured.buffer = io.StringIO()
+    try:
+        yield
+    finally:
+        text = _ThreadOutput.captured.buffer.getvalue()
+        _ThreadOutput.captured.buffer = None
+
+        with _ThreadOutput.lock:
+            stream.write(text)
+            stream.flush()
+
+        _ThreadOutput.uninstall()
+
+
 # COMMANDLINE ARGUMENTS PARSING -----------------------------------------------
 
 def convert_to_lower(arr):
@@ -38,13 +142,14 @@ def convert_to_lower(arr):
 
 
 def validate_arguments(args):
-    invalid = set(args) - set(LOCAL + BETA + PRO + QUERY_ONLY + COMPLETE)
+    invalid = set(args) - set(LOCAL + BETA + PRO + QUERY_ONLY + COMPLETE + NO_CACHE)
     if invalid:
         print("\n\033[1m" + "WARNING: The following arguments are invalid and "
               f"will be ignored: {', '.join(invalid)}\033[0m"
               "\nPlease only use the following arguments:" +
               f"\nQuery-only mode: {QUERY_ONLY[0]}" +
               f"\nQuery-only mode: {COMPLETE[0]}" +
+              f"\nSkip the response cache: {NO_CACHE[0]}" +
               f"\nEnvironments: {PRO[0]}, {BETA[0]} or {LOCAL[0]}.\n")
 
 
@@ -69,6 +174,10 @@ def process_arguments(args):
     validate_arguments(arguments)
     query_only_mode = bool(set(QUERY_ONLY) & set(args))
     complete_mode = bool(set(COMPLETE) & set(args))
+
+    if set(NO_CACHE) & set(arguments):
+        Settings.add('response_cache', False)
+
     base_url, model_url = process_environment(arguments)
 
     return base_url, model_url, query_only_mode, complete_mode
@@ -0,0 +1,198 @@
+'''
+Persistent cache for responses of read-only requests to the engine.
+
+Responses are stored in a SQLite database, keyed on the method, the full url
+(including the params) and the token used. A cached response of a scenario is
+only used while the updated_at (and the ETag, when the engine sends one) of the
+scenario is the same as when it was stored. Other responses are revalidated with
+their ETag. Entries expire after a time to live, and the least recently used
+entries are removed when the cache grows larger than its maximum size. Streamed
+responses larger than the maximum entry size are not stored.
+'''
+import hashlib
+import json
+import sqlite3
+import tempfile
+import threading
+import time
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from helpers.file_helpers import get_folder
+from helpers.settings import Settings
+
+DEFAULT_TTL = 24  # hours
+DEFAULT_CACHE_SIZE = 500  # MB
+DEFAULT_ENTRY_SIZE = 50  # MB
+STREAM_CHUNK_SIZE = 2 ** 16
+
+
+class ResponseCache:
+    '''SQLite store of responses, see the module docstring'''
+
+    FILE_NAME = 'responses.sqlite'
+
+    def __init__(self, path=None, ttl=None, max_size=None, max_entry_size=None):
+        '''
+        Params:
+            path (Path): The database file, defaults to responses.sqlite in the
+                         response_cache_folder setting
+            ttl (float): Hours after which an entry expires, defaults to the
+                         response_cache_ttl setting
+            max_size (float): Maximum size of the cache in MB, defaults to the
+                              response_cache_size setting
+            max_entry_size (float): Maximum size of a streamed response that is
+                                    stored in MB, defaults to the
+                                    response_cache_entry_size setting
+        '''
+        self.path = path if path is not None else get_folder('response_cache_folder') / self.FILE_NAME
+        self.ttl = (ttl if ttl is not None else Settings.get('response_cache_ttl') or DEFAULT_TTL) * 3600
+        self.max_size = (
+            max_size if max_size is not None
+            else Settings.get('response_cache_size') or DEFAULT_CACHE_SIZE
+        ) * 1e6
+        self.max_entry_size = (
+            max_entry_size if max_entry_size is not None
+            else Settings.get('response_cache_entry_size') or DEFAULT_ENTRY_SIZE
+        ) * 1e6
+
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.connection = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        with self.lock, self.connection:
+            self.connection.execute('PRAGMA journal_mode=WAL')
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS responses ('
+                'key TEXT PRIMARY KEY, url TEXT, status INTEGER, headers TEXT, content BLOB, '
+                'validator TEXT, stored_at REAL, used_at REAL, size INTEGER)'
+            )
+
+
+    @staticmethod
+    def key(method, url, token=None):
+        '''Returns the key of a request, the token is hashed so it is never stored'''
+        token_hash = hashlib.sha256(token.encode()).hexdigest() if token else ''
+        return hashlib.sha256(f'{method.upper()} {url} {token_hash}'.encode()).hexdigest()
+
+
+    def get(self, key):
+        '''
+        Returns the entry stored under key as a dict with the response, validator
+        and etag, or None if there is no entry or it expired.
+        '''
+        with self.lock:
+            row = self.connection.execute(
+                'SELECT url, status, headers, content, validator, stored_at FROM responses '
+                'WHERE key = ?', (key,)
+            ).fetchone()
+
+        if row is None:
+            return None
+
+        url, status, headers, content, validator, stored_at = row
+        if time.time() - stored_at > self.ttl:
+            self.delete(key)
+            return None
+
+        response = self.build_response(url, status, json.loads(headers), content)
+
+        return {'response': response, 'validator': validator, 'etag': response.headers.get('ETag')}
+
+
+    def put(self, key, response, validator=None):
+        '''Stores a successful response under key, and evicts old entries if needed'''
+        self._store(key, response, response.content, validator)
+
+
+    def put_streamed(self, key, response, validator=None):
+        '''
+        Reads a successful streamed response in chunks and stores it under key,
+        unless it is larger than the maximum entry size. The body is spooled to a
+        temporary file, which is only kept in memory up to that size. Returns a
+        response streaming the body from that file, the original one is closed.
+        '''
+        body = tempfile.SpooledTemporaryFile(max_size=int(self.max_entry_size), dir=self.path.parent)
+        try:
+            with response:
+                for chunk in response.iter_content(chunk_size=STREAM_CHUNK_SIZE):
+                    body.write(chunk)
+
+            if body.tell() <= self.max_entry_size:
+                body.seek(0)
+                self._store(key, response, body.read(), validator)
+        except BaseException:
+            body.close()
+            raise
+
+        body.seek(0)
+        streamed = self.build_response(response.url, response.status_code, response.headers, False)
+        streamed.raw = body
+        streamed._content_consumed = False
+
+        return streamed
+
+
+    def touch(self, key):
+        '''Marks an entry as recently used'''
+        with self.lock, self.connection:
+            self.connection.execute('UPDATE responses SET used_at = ? WHERE key = ?', (time.time(), key))
+
+
+    def delete(self, key):
+        with self.lock, self.connection:
+            self.connection.execute('DELETE FROM responses WHERE key = ?', (key,))
+
+
+    def _store(self, key, response, content, validator):
+        now = time.time()
+
+        with self.lock, self.connection:
+            self.connection.execute(
+                'INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (key, response.url, response.status_code, json.dumps(dict(response.headers)),
+                 content, validator, now, now, len(content))
+            )
+
+        self.evict()
+
+
+    def evict(self):
+        '''Removes expired entries, and the least recently used ones until the cache fits'''
+        with self.lock, self.connection:
+            self.connection.execute('DELETE FROM responses WHERE stored_at < ?', (time.time() - self.ttl,))
+
+            total_size = self.connection.execute(
+                'SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+            if total_size <= self.max_size:
+                return
+
+            for key, size in self.connection.execute(
+                    'SELECT key, size FROM responses ORDER BY used_at').fetchall():
+                if total_size <= self.max_size:
+                    break
+
+                self.connection.execute('DELETE FROM responses WHERE key = ?', (key,))
+                total_size -= size
+
+
+    def clear(self):
+        with self.lock, self.connection:
+            self.connection.execute('DELETE FROM responses')
+
+
+    @staticmethod
+    def build_response(url, status, headers, content):
+        '''Returns a requests.Response holding the cached content'''
+        response = requests.Response()
+        response.url = url
+        response.status_code = status
+        response.headers = CaseInsensitiveDict(headers)
+        response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+        response._content = content
+        response._content_consumed = True
+
+        return response
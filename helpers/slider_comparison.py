@@ -0,0 +1,128 @@
+'''Runs the slider sets of a slider comparison analysis against copies of a base scenario'''
+
+import queue
+
+import pandas as pd
+
+from helpers.concurrency import map_concurrently
+from helpers.helpers import grouped_output, print_bold
+
+RUNS = ['start', 'future']
+SLIDER_COLUMNS = ['slider_name', 'slider_start_value', 'slider_future_value']
+RESULT_COLUMNS = ['set_name', 'output_gquery', 'unit', 'result_start_value', 'result_future_value']
+
+
+class SliderComparison:
+    '''
+    Evaluates the slider sets in scratch copies of the base scenario, so the base
+    scenario itself is left untouched. Up to max_workers sets are evaluated at
+    the same time, each in its own copy. The copies are made once and reused:
+    after a set, the sliders it changed are restored to the values of the base
+    scenario, so the sliders of one set never affect the results of another.
+    The copies are deleted when the run ends.
+    '''
+
+    def __init__(self, base_scenario, max_workers=1):
+        self.base_scenario = base_scenario
+        self.max_workers = max_workers
+
+
+    def run(self, settings):
+        '''
+        Params:
+            settings (pd.DataFrame): The slider comparison settings, with a set_name,
+                                     slider_name, slider_start_value, slider_future_value
+                                     and output_gquery column
+
+        Returns:
+            pd.DataFrame with the start and future result of the gqueries of each set,
+            indexed on set_name, in the order of the sets in the settings
+        '''
+        sets = {name: settings[settings['set_name'] == name].set_index('set_name')
+                for name in settings['set_name'].unique()}
+        base_values = self.base_scenario.api.get_scenario_settings()
+
+        copies = []
+        available = queue.Queue()
+
+        def run_in_copy(name):
+            scenario = available.get()
+            try:
+                results = self.run_set(name, sets[name], scenario)
+                self.restore(scenario, sets[name], base_values)
+                return results
+            finally:
+                available.put(scenario)
+
+        try:
+            for number in range(1, max(1, min(self.max_workers, len(sets))) + 1):
+                copies.append(self.base_scenario.scratch_copy(f'{self.base_scenario.short_name}_{number}'))
+                available.put(copies[-1])
+
+            if self.max_workers <= 1:
+                results = {name: run_in_copy(name) for name in sets}
+            else:
+                print_bold(f"\nEvaluating up to {self.max_workers} slider sets at the same time.")
+
+                def run_grouped(name):
+                    with grouped_output():
+                        return run_in_copy(name)
+
+                results = dict(map_concurrently(run_grouped, sets, self.max_workers))
+        finally:
+            for scenario in copies:
+                scenario.delete()
+
+        return pd.concat(
+            [pd.DataFrame(columns=RESULT_COLUMNS).set_index('set_name')] +
+            [results[name] for name in sets]
+        )
+
+
+    def run_set(self, name, slider_set, scenario):
+        '''
+        Evaluates the start and future values of one slider set in the scenario, a
+        scratch copy of the base scenario. Returns a pd.DataFrame with a row for
+        each output gquery.
+        '''
+        print_bold(f"\nStarting set: {name}")
+
+        query_list = slider_set['output_gquery'].unique().tolist()
+        results = {}
+
+        for run in RUNS:
+            print(f"Obtaining results for slider {run} value")
+            scenario.user_values = (
+                slider_set.set_index('slider_name')[f'slider_{run}_value'].dropna().to_dict()
+            )
+
+            if not scenario.update({}, query_list):
+                scenario.query(query_list)
+
+            results[run] = scenario.query_results
+
+        # The other columns of the set are taken from its first row
+        first_row = slider_set.drop(SLIDER_COLUMNS + ['output_gquery'], axis=1).iloc[0]
+
+        return pd.DataFrame([
+            {
+                'output_gquery': query,
+                'unit': results['start'].loc[query, 'unit'],
+                'result_start_value': results['start'].loc[query, 'future'],
+                'result_future_value': results['future'].loc[query, 'future'],
+                **first_row.to_dict()
+            }
+            for query in query_list
+        ], index=pd.Index([name] * len(query_list), name='set_name'))
+
+
+    @staticmethod
+    def restore(scenario, slider_set, base_values):
+        '''
+        Sets the sliders of the set back to their value in the base scenario, or
+        resets them when the base scenario does not set them
+        '''
+        scenario.user_values = {
+            slider: base_values.get(slider, 'reset') for slider in slider_set['slider_name'].unique()
+        }
+        scenario.api.update_inputs()
@@ -6,7 +6,8 @@ from helpers.ETM_API import ETM_API, SessionWithUrlBase
 from helpers.Scenario import ScenarioCollection
 from helpers.Curves import load_curve_file_dict
 from helpers.helpers import process_arguments, print_bold
-from helpers.file_helpers import query_list, data_download_dict, write_csv
+from helpers.file_helpers import query_list, data_download_dict
+from helpers.settings import Settings
 
 if __name__ == "__main__":
 
@@ -32,24 +33,30 @@ if __name__ == "__main__":
                    "outcomes will be collected, no changes to scenarios will "
                    "be made.")
 
-    for scenario in scenarios:
+    def process_scenario(scenario):
         print(f"\nProcessing scenario {scenario.short_name}..")
 
+        queried = False
+
         if not query_only_mode:
             if scenario.heat_demand:
                 scenario.set_heat_demand_curves()
 
-            scenario.update(curve_file_dict)
+            queried = scenario.update(curve_file_dict, query_list)
 
-        if query_list:
+        if query_list and not queried:
             print(' Getting queries')
             scenario.query(query_list)
 
         if data_download_dict:
             print(' Getting downloads')
-            for name, download in scenario.get_data_downloads(data_download_dict):
-                write_csv(download, f'{scenario.short_name}_{name}',
-                    folder=scenario.short_name, index=False, header=True)
+            scenario.export_data_downloads(data_download_dict)
+
+    concurrent_scenarios = Settings.get('concurrent_scenarios') or 1
+    if concurrent_scenarios > 1:
+        print_bold(f"\nProcessing up to {concurrent_scenarios} scenarios at the same time.")
+
+    scenarios.process(process_scenario, max_workers=concurrent_scenarios)
 
     scenarios.export_scenario_outcomes()
     scenarios.export_ids()
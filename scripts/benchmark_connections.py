@@ -0,0 +1,60 @@
+# Benchmarks the requests per second of a SessionWithUrlBase against a local stub
+# engine, with connections closed after each request (the old behaviour) and with
+# pooled keep-alive connections. Run with: python scripts/benchmark_connections.py [requests]
+from os import sys, path
+sys.path.append(path.dirname(path.dirname(path.abspath(__file__))))
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from helpers.ETM_API import SessionWithUrlBase
+from helpers.settings import Settings
+
+
+class StubEngineHandler(BaseHTTPRequestHandler):
+    '''Answers every request with a small JSON body, keeping the connection open if asked'''
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def do_PUT(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        body = json.dumps({'id': 1}).encode()
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def requests_per_second(url, number_of_requests, keep_alive):
+    Settings.add('connection_keep_alive', keep_alive)
+    session = SessionWithUrlBase(url)
+
+    start = time.perf_counter()
+    for _ in range(number_of_requests):
+        session.put('/scenarios/1', json={'scenario': {'user_values': {}}}).raise_for_status()
+
+    return number_of_requests / (time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    number_of_requests = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubEngineHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f'http://127.0.0.1:{server.server_address[1]}'
+
+    closing = requests_per_second(url, number_of_requests, keep_alive=False)
+    pooled = requests_per_second(url, number_of_requests, keep_alive=True)
+
+    print(f'Connection: close  {closing:8.1f} requests/s')
+    print(f'Keep-alive (pool)  {pooled:8.1f} requests/s')
+    print(f'Speed-up           {pooled / closing:8.1f}x')
+
+    server.shutdown()
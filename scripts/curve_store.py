@@ -0,0 +1,35 @@
+# Packs the single-column csv curves in a folder into a memory-mapped curve store, or unpacks
+# a curve store to csv curves. Folders are relative to the input_curves_folder, unless the
+# --output option is given, then they are relative to the output_curves_folder.
+#
+# Run with: python scripts/curve_store.py pack|unpack|compact <folder> [--output]
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import argparse
+
+from helpers.curve_store import CurveStore
+from helpers.file_helpers import get_folder
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Pack csv curves into a curve store, or unpack them')
+    parser.add_argument('action', choices=['pack', 'unpack', 'compact'])
+    parser.add_argument('folder')
+    parser.add_argument('--output', action='store_true', help='Use the output_curves_folder')
+    args = parser.parse_args()
+
+    folder = get_folder('output_curves_folder' if args.output else 'input_curves_folder') / args.folder
+
+    if args.action == 'pack':
+        store = CurveStore.from_csv_folder(folder)
+        print(f'Packed {len(store.keys())} curves into {store.data_path}')
+    elif args.action == 'unpack':
+        store = CurveStore(folder)
+        store.to_csv_folder()
+        print(f'Unpacked {len(store.keys())} curves to {folder}')
+    else:
+        store = CurveStore(folder)
+        store.compact()
+        print(f'Compacted {len(store.keys())} curves in {store.data_path}')
@@ -3,10 +3,41 @@ from pathlib import Path
 sys.path.append(str(Path(__file__).resolve().parent.parent))
 
 import argparse
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
 import yaml
 from helpers.ETM_API import ETM_API, SessionWithUrlBase
 from helpers.Scenario import ScenarioCollection
 from helpers.helpers import process_arguments
+from helpers.settings import Settings
+
+
+def apply_settings(settings):
+    '''
+    Replaces the settings of a worker process by those of the parent process, which
+    include the settings changed at runtime, like --no-cache
+    '''
+    for setting, value in settings.items():
+        Settings.add(setting, value)
+
+
+def worker_pool(workers, mp_context=None):
+    '''Returns a process pool of which the workers use the settings of this process'''
+    return ProcessPoolExecutor(max_workers=workers, mp_context=mp_context, initializer=apply_settings,
+                               initargs=(dict(Settings().instance.settings),))
+
+
+def generate_scenario_heat_demand_curves(scenario, input_curves_folder):
+    '''
+    Sets the heat demand curves on the scenario and returns the scenario. Runs in a
+    worker process when generating in parallel, which is why it lives at module level.
+    '''
+    scenario.heat_demand = str(Path(input_curves_folder).resolve() / scenario.heat_demand)
+    scenario.set_heat_demand_curves()
+
+    return scenario
+
 
 class HeatDemandCurveGenerator:
     def __init__(self, settings_path='config/local.settings.yml', base_url=None):
@@ -23,11 +54,31 @@ class HeatDemandCurveGenerator:
 
     def generate_heat_demand_curves(self, scenario):
         # Set the heat demand curves for the specific scenario
-        scenario.heat_demand = str(Path(self.settings['input_curves_folder']).resolve() / scenario.heat_demand)
-        scenario.set_heat_demand_curves()
+        generate_scenario_heat_demand_curves(scenario, self.settings['input_curves_folder'])
         # Store the generated heat demand curves for further processing
         self.curves = list(scenario.heat_demand_curves)
 
+    def generate_all_heat_demand_curves(self, scenarios, workers=1):
+        '''
+        Generates the heat demand curves for all scenarios and yields each scenario
+        with its curves set, in the original order. With more than one worker the
+        curves are generated in a process pool, and each scenario is yielded as
+        soon as it (and all scenarios before it) are done.
+        '''
+        input_curves_folder = self.settings['input_curves_folder']
+
+        if workers <= 1:
+            for scenario in scenarios:
+                self.generate_heat_demand_curves(scenario)
+                yield scenario
+            return
+
+        with worker_pool(workers) as executor:
+            for scenario in executor.map(generate_scenario_heat_demand_curves,
+                                         scenarios, repeat(input_curves_folder)):
+                self.curves = list(scenario.heat_demand_curves)
+                yield scenario
+
     def create_etm_session(self, base_url=None):
         # Create a session using the helper class with base URL from settings
         session = SessionWithUrlBase(self.base_url)
@@ -56,16 +107,23 @@ class HeatDemandCurveGenerator:
             curve.to_csv(folder=str(output_folder))
 
 if __name__ == "__main__":
-    base_url, model_url, query_only_mode,_ = process_arguments(sys.argv)
     parser = argparse.ArgumentParser(description="Generate and export weather curves.")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Number of processes generating the curves in parallel")
+    args, remaining_args = parser.parse_known_args()
+
+    base_url, model_url, query_only_mode,_ = process_arguments([sys.argv[0]] + remaining_args)
 
     print("Uploading to:", base_url)
     settings_path = 'config/local.settings.yml'  # Change this to point to your local settings file
 
     generator = HeatDemandCurveGenerator(settings_path, base_url)
-    for scenario in ScenarioCollection.from_csv():  # Load scenarios from scenario_list.csv
+    scenarios = ScenarioCollection.from_csv()  # Load scenarios from scenario_list.csv
+    for scenario in scenarios:
         print(f"Loaded scenario: {scenario.short_name}")
-        generator.generate_heat_demand_curves(scenario)
+
+    for scenario in generator.generate_all_heat_demand_curves(scenarios, workers=args.workers):
+        print(f"Generated curves for scenario: {scenario.short_name}")
         generator.export_curves(scenario)
 
         # Create the ETM session and upload the curves for this scenario
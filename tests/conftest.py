@@ -9,6 +9,8 @@ sys.path.append(path.dirname(path.dirname(path.abspath(__file__))))
 import pytest
 import pandas as pd
 from helpers.Scenario import Scenario
+from helpers.curve_manifest import CurveManifest
+from helpers.settings import Settings
 
 @pytest.fixture
 def default_scenario(test_data=None):
@@ -34,3 +36,22 @@ def default_scenario(test_data=None):
     ]
 
     return Scenario(pd.Series(test_data, index=index))
+
+
+@pytest.fixture
+def settings():
+    '''
+    Restores all settings after the test, so settings changed with Settings.add
+    do not leak into other tests
+    '''
+    saved = dict(Settings().instance.settings)
+    yield Settings
+    Settings.instance.settings = saved
+
+
+@pytest.fixture(autouse=True)
+def curve_manifest(tmp_path):
+    '''Keeps the manifest of uploaded curves in a temporary folder'''
+    CurveManifest._instance = CurveManifest(tmp_path / CurveManifest.FILE_NAME)
+    yield CurveManifest._instance
+    CurveManifest._instance = None
@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+
+from helpers.Curves import Curve
+from helpers.file_helpers import read_csv
+from helpers.heat_file_utils import read_heat_demand_input
+from helpers.heat_demand.cache import ProfileCache
+from helpers.heat_demand.weather_years_profile_generator import WeatherYearsGenerator
+from helpers.settings import Settings
+
+
+@pytest.fixture
+def generator():
+    Settings.add('input_curves_folder', 'tests/fixtures/')
+
+    return WeatherYearsGenerator(
+        read_heat_demand_input('heat_demand', 'temperature'),
+        read_heat_demand_input('heat_demand', 'irradiation'),
+        therm=read_csv('heat_demand/thermostat', curve=True).astype(float),
+        region='heat_demand'
+    )
+
+
+def test_fetch_caches_profiles(generator, tmp_path):
+    cache = ProfileCache(folder=tmp_path, enabled=True)
+
+    generated = cache.fetch(generator)
+    cached = cache.fetch(generator)
+
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert len(list(tmp_path.glob('*.npz'))) == 1
+    assert [curve.key for curve in cached] == [curve.key for curve in generated]
+    for curve, expected in zip(cached, generated):
+        np.testing.assert_array_equal(curve.data, expected.data)
+
+
+def test_key_depends_on_inputs(generator):
+    key = ProfileCache.key(generator)
+
+    generator.region = 'elsewhere'
+    assert ProfileCache.key(generator) != key
+
+    generator.region = 'heat_demand'
+    generator.temp = generator.temp + 0.1
+    assert ProfileCache.key(generator) != key
+
+
+def test_evicts_least_recently_used(tmp_path):
+    cache = ProfileCache(folder=tmp_path, max_size=0.1, enabled=True)
+    cache.put('first', [Curve('curve', np.full(8760, 1.0))])
+    cache.put('second', [Curve('curve', np.full(8760, 2.0))])
+
+    assert not (tmp_path / 'first.npz').exists()
+    assert cache.get('second')[0].data[0] == 2.0
+
+
+def test_fetch_does_not_cache_failed_profiles(generator, tmp_path, monkeypatch):
+    cache = ProfileCache(folder=tmp_path, enabled=True)
+
+    def smoothe_and_aggregate(curve, insulation_type, seed=None):
+        raise ValueError('failed')
+
+    monkeypatch.setattr(generator, '_smoothe_and_aggregate', smoothe_and_aggregate)
+    curves = cache.fetch(generator)
+
+    assert curves == []
+    assert 'insulation_terraced_houses_low' in generator.failed_curves
+    assert not list(tmp_path.glob('*.npz'))
+
+
+def test_disabled_by_default(settings, tmp_path):
+    settings.add('heat_demand_cache_folder', str(tmp_path))
+    settings.add('heat_demand_cache', None)
+
+    assert not ProfileCache().enabled
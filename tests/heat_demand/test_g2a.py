@@ -0,0 +1,78 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from helpers.buildings_profile_helper import BuildingsModel
+from helpers.heat_demand.g2a import g2a_heat_demand, g2a_parameters
+from helpers.heat_demand.weather_years_profile_generator import WeatherYearsGenerator
+
+
+@pytest.fixture
+def weather():
+    rng = np.random.default_rng(3)
+    return pd.Series(rng.normal(10, 8, 8760)), pd.Series(rng.uniform(0, 12, 8760))
+
+
+def rowwise_heat_demand(temperature, wind_speed, reference, slope, constant):
+    effective = temperature - wind_speed / 1.5
+    return np.array([
+        (r - e) * s + c if e < r else c
+        for e, r, s, c in zip(effective, reference, slope, constant)
+    ])
+
+
+def test_g2a_heat_demand_with_constant_parameters(weather):
+    temperature, wind_speed = weather
+
+    demand = g2a_heat_demand(temperature, wind_speed, 15.0, 0.2, 1.0)
+    expected = rowwise_heat_demand(temperature, wind_speed, *([param] * 8760 for param in (15.0, 0.2, 1.0)))
+
+    np.testing.assert_array_equal(demand, expected)
+
+
+def test_g2a_heat_demand_with_hourly_parameters(weather):
+    temperature, wind_speed = weather
+    reference = np.linspace(10, 18, 8760)
+    slope = np.linspace(0.1, 0.3, 8760)
+    constant = np.full(8760, 0.5)
+
+    demand = g2a_heat_demand(temperature, wind_speed, reference, slope, constant)
+
+    np.testing.assert_array_equal(
+        demand, rowwise_heat_demand(temperature, wind_speed, reference, slope, constant))
+
+
+def test_g2a_heat_demand_for_stacked_years(weather):
+    temperature, wind_speed = weather
+    temperatures = np.stack([temperature, temperature + 2, temperature - 2])
+    wind_speeds = np.stack([wind_speed] * 3)
+
+    demand = g2a_heat_demand(temperatures, wind_speeds, 15.0, 0.2, 1.0)
+
+    assert demand.shape == (3, 8760)
+    np.testing.assert_array_equal(
+        demand[1], g2a_heat_demand(temperature + 2, wind_speed, 15.0, 0.2, 1.0))
+
+
+def test_g2a_parameters():
+    constant = pd.DataFrame({'reference': [15.0], 'slope': [0.2], 'constant': [1.0]})
+    assert g2a_parameters(constant, 8760) == (15.0, 0.2, 1.0)
+
+    with pytest.raises(ValueError):
+        g2a_parameters(pd.concat([constant] * 2), 8760)
+
+
+def test_buildings_model_matches_generator(weather):
+    temperature, wind_speed = weather
+    parameters = pd.DataFrame({'reference': [15.0], 'slope': [0.2], 'constant': [1.0]})
+
+    model = BuildingsModel()
+    model.reference, model.slope, model.constant = 15.0, 0.2, 1.0
+    profile = model.make_heat_demand_profile(temperature, wind_speed)
+
+    generator = WeatherYearsGenerator(temperature, wind_speed=wind_speed, g2a_params=parameters)
+    buildings, agriculture = generator.generate_building_agriculture_profiles()
+
+    assert abs(profile.sum() - 1 / 3600) < 1e-12
+    np.testing.assert_allclose(buildings.data, profile.values, rtol=1e-12)
+    np.testing.assert_array_equal(buildings.data, agriculture.data)
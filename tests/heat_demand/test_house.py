@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+from helpers.file_helpers import read_csv
+from helpers.heat_file_utils import read_heat_demand_input
+from helpers.heat_demand import house as house_module
+from helpers.heat_demand.house import House, HouseBatch
+from helpers.heat_demand.config import insulation_config
+from helpers.settings import Settings
+
+
+@pytest.fixture
+def weather():
+    Settings.add('input_curves_folder', 'tests/fixtures/')
+
+    temperature = read_heat_demand_input('heat_demand', 'temperature')
+    irradiation = insulation_config.from_J_cm2_to_Kwh_m2(
+        read_heat_demand_input('heat_demand', 'irradiation'))
+    thermostat = read_csv('heat_demand/thermostat', curve=True).astype(float)
+
+    return temperature, irradiation, thermostat
+
+
+def scalar_heat_demand(house, temperature, irradiation):
+    return [
+        house.calculate_heat_demand(temperature[hour], irradiation[hour], hour % 24)
+        for hour in range(len(temperature))
+    ]
+
+
+@pytest.mark.parametrize('simulate', [
+    house_module._simulate_houses_numpy, house_module._simulate_houses
+])
+def test_house_batch_matches_house(weather, monkeypatch, simulate):
+    temperature, irradiation, thermostat = weather
+    monkeypatch.setattr(house_module, '_simulate_houses', simulate)
+
+    combinations = [
+        (house_type, insulation)
+            for house_type in insulation_config.HOUSE_NAMES
+            for insulation in insulation_config.INSULATION_TYPES
+    ]
+    batch = HouseBatch(*zip(*combinations), thermostat)
+    heat_demand = batch.calculate_heat_demand(temperature, irradiation)
+
+    assert heat_demand.shape == (8760, len(combinations))
+
+    for index, (house_type, insulation) in enumerate(combinations):
+        house = House(house_type, insulation, thermostat)
+        expected = scalar_heat_demand(house, temperature, irradiation)
+
+        np.testing.assert_array_equal(heat_demand[:, index], expected)
+        assert batch.inside_temperature[index] == house.inside_temperature
@@ -0,0 +1,106 @@
+import numpy as np
+
+from helpers.heat_demand import smoothing
+
+
+def reference_smoothed_demand(heat_demand, deviations, steps):
+    '''The original, shift-by-shift implementation of the smoothing'''
+    interpolated = []
+    for index, value in enumerate(heat_demand):
+        stop = heat_demand[(index + 1) % len(heat_demand)]
+        interpolated.extend(value + i * (stop - value) / steps for i in range(steps))
+
+    cumulative = np.zeros(len(interpolated))
+    for num in deviations:
+        cumulative += np.roll(interpolated, num)
+
+    cumulative = np.roll(cumulative, steps // 2)
+    return [sum(cumulative[i:(i + steps)]) / steps for i in range(0, len(cumulative), steps)]
+
+
+def test_interpolate():
+    interpolated = smoothing.interpolate([0.0, 10.0, 20.0], 2)
+
+    np.testing.assert_array_equal(interpolated, [0.0, 5.0, 10.0, 15.0, 20.0, 10.0])
+
+
+def test_trim_interpolated_keeps_total():
+    curve = np.random.default_rng(1).random(240)
+    trimmed = smoothing.trim_interpolated(curve, smoothing.INTERPOLATION_STEPS)
+
+    assert len(trimmed) == 24
+    assert abs(trimmed.sum() * smoothing.INTERPOLATION_STEPS - curve.sum()) < 1e-9
+
+
+def test_smoothed_demand_matches_reference():
+    heat_demand = np.random.default_rng(2).random(168)
+
+    smoothed = smoothing.calculate_smoothed_demand(heat_demand, 'medium', np.random.default_rng(42))
+
+    deviations = smoothing.generate_deviations(
+        smoothing.NUMBER_OF_HOUSES, smoothing.HOURS_SHIFTED['medium'], np.random.default_rng(42))
+
+    expected = reference_smoothed_demand(heat_demand, deviations, smoothing.INTERPOLATION_STEPS)
+
+    np.testing.assert_allclose(smoothed, expected, rtol=1e-12)
+
+
+def test_smoothed_demand_is_independent_of_order():
+    heat_demand = np.random.default_rng(2).random(168)
+    seed = smoothing.deviation_seed('region', 'apartments', 'low')
+
+    first = smoothing.calculate_smoothed_demand(heat_demand, 'low', seed)
+    smoothing.calculate_smoothed_demand(heat_demand, 'high', seed + 1)
+    np.random.seed(0)
+    second = smoothing.calculate_smoothed_demand(heat_demand, 'low', seed)
+
+    np.testing.assert_array_equal(first, second)
+
+
+def test_deviations_are_memoized():
+    deviations = smoothing.deviations_for('low', 1)
+
+    assert smoothing.deviations_for('low', 1) is deviations
+    assert not deviations.flags.writeable
+    assert smoothing.deviations_for('low', np.random.default_rng(1)) is not deviations
+    np.testing.assert_array_equal(smoothing.deviations_for('low', np.random.default_rng(1)), deviations)
+
+
+def test_smoothed_demands_matches_single_curves():
+    heat_demands = np.random.default_rng(3).random((3, 168))
+    insulation_types = ['low', 'medium', 'high']
+    seeds = [11, 12, 13]
+
+    smoothed = smoothing.calculate_smoothed_demands(heat_demands, insulation_types, seeds)
+
+    for row, heat_demand, insulation_type, seed in zip(smoothed, heat_demands, insulation_types, seeds):
+        expected = smoothing.calculate_smoothed_demand(heat_demand, insulation_type, seed)
+        np.testing.assert_allclose(row, expected, rtol=1e-9)
+
+
+def baseline_deviations(insulation_type):
+    '''Deviations as drawn from the global random state before curves were seeded separately'''
+    random_numbers = np.random.normal(
+        loc=0.0, scale=smoothing.HOURS_SHIFTED[insulation_type], size=smoothing.NUMBER_OF_HOUSES)
+
+    return (np.round(random_numbers, 1) * 10).astype(int)
+
+
+def test_legacy_random_state_matches_global_seed(monkeypatch):
+    monkeypatch.setattr(smoothing, '_LEGACY_RANDOM_STATE', np.random.RandomState(smoothing.RANDOM_SEED))
+    heat_demand = np.random.default_rng(2).random(168)
+    insulation_types = ['low', 'medium', 'high', 'low']
+
+    np.random.seed(smoothing.RANDOM_SEED)
+    expected = [
+        reference_smoothed_demand(heat_demand, baseline_deviations(insulation_type),
+            smoothing.INTERPOLATION_STEPS)
+        for insulation_type in insulation_types
+    ]
+
+    smoothed = [
+        smoothing.calculate_smoothed_demand(heat_demand, insulation_type, smoothing.legacy_random_state())
+        for insulation_type in insulation_types
+    ]
+
+    np.testing.assert_allclose(smoothed, expected, rtol=1e-12)
@@ -0,0 +1,123 @@
+import multiprocessing
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from helpers.file_helpers import read_csv
+from helpers.heat_file_utils import read_heat_demand_input, load_weather_years
+from helpers.heat_demand import smoothing
+from helpers.heat_demand.config import insulation_config
+from helpers.heat_demand.weather_years_profile_generator import (WeatherYearsGenerator,
+    WeatherYearsBatchGenerator)
+from helpers.settings import Settings
+from scripts.weather_years import worker_pool
+
+
+@pytest.fixture
+def weather():
+    Settings.add('input_curves_folder', 'tests/fixtures/')
+
+    temperature = read_heat_demand_input('heat_demand', 'temperature')
+    irradiation = read_heat_demand_input('heat_demand', 'irradiation')
+    thermostat = read_csv('heat_demand/thermostat', curve=True).astype(float)
+    wind_speed = pd.Series(np.random.default_rng(4).uniform(0, 10, 8760))
+    parameters = pd.DataFrame({'reference': [15.0], 'slope': [0.2], 'constant': [1.0]})
+
+    years = [1987, 1988, 1989]
+    stack = lambda curve, deltas: pd.DataFrame(
+        [curve.to_numpy() + delta for delta in deltas], index=years)
+
+    return {
+        'temp': stack(temperature, [0, 1.5, -2]),
+        'irr': stack(irradiation, [0, 0, 0]),
+        'wind_speed': stack(wind_speed, [0, 1, 2]),
+        'therm': thermostat,
+        'g2a_params': parameters
+    }
+
+
+def test_batch_matches_single_years(weather):
+    profiles = WeatherYearsBatchGenerator(**weather, region='test', chunk_size=2).generate_all_profiles()
+
+    assert list(profiles.keys()) == [1987, 1988, 1989]
+
+    for year, curves in profiles.items():
+        single = WeatherYearsGenerator(
+            weather['temp'].loc[year], weather['irr'].loc[year], weather['wind_speed'].loc[year],
+            weather['therm'], weather['g2a_params'], region='test'
+        ).generate_all_profiles()
+
+        assert [curve.key for curve in curves] == [curve.key for curve in single]
+        for curve, expected in zip(curves, single):
+            np.testing.assert_allclose(curve.data, expected.data, rtol=1e-9, atol=1e-20)
+
+
+def test_legacy_seed_reproduces_baseline_profiles(weather, settings, monkeypatch):
+    '''With legacy_smoothing_seed, profiles are smoothed like np.random.seed(1337) used to'''
+    settings.add('legacy_smoothing_seed', True)
+    monkeypatch.setattr(smoothing, '_LEGACY_RANDOM_STATE', np.random.RandomState(smoothing.RANDOM_SEED))
+
+    generator = WeatherYearsGenerator(weather['temp'].loc[1987], weather['irr'].loc[1987],
+        therm=weather['therm'], region='test')
+    curves = generator.generate_house_profiles()
+
+    combinations = [
+        (house_type, insulation_type)
+            for house_type in insulation_config.HOUSE_NAMES
+            for insulation_type in insulation_config.INSULATION_TYPES
+    ]
+    heat_demand = generator._heat_demand_curves(combinations, generator.temp,
+        insulation_config.from_J_cm2_to_Kwh_m2(generator.irr), generator.therm)
+
+    np.random.seed(smoothing.RANDOM_SEED)
+    for index, (curve, (_, insulation_type)) in enumerate(zip(curves, combinations)):
+        deviations = (np.round(np.random.normal(0.0, smoothing.HOURS_SHIFTED[insulation_type],
+            smoothing.NUMBER_OF_HOUSES), 1) * 10).astype(int)
+        interpolated = smoothing.interpolate(heat_demand[:, index], smoothing.INTERPOLATION_STEPS)
+        expected = smoothing.trim_interpolated(
+            smoothing.sum_shifted_curves(interpolated, deviations), smoothing.INTERPOLATION_STEPS)
+
+        np.testing.assert_allclose(curve.data, expected / expected.sum() / 3600, rtol=1e-9)
+
+
+def test_batch_with_arrays(weather):
+    generator = WeatherYearsBatchGenerator(
+        weather['temp'].to_numpy(), wind_speed=weather['wind_speed'].to_numpy(),
+        g2a_params=weather['g2a_params'])
+    profiles = generator.generate_all_profiles()
+
+    assert list(profiles.keys()) == [0, 1, 2]
+    assert all(len(curves) == 2 for curves in profiles.values())
+
+
+def test_batch_validates_lengths(weather):
+    weather['wind_speed'] = weather['wind_speed'].iloc[:, :100]
+
+    with pytest.raises(ValueError):
+        WeatherYearsBatchGenerator(**weather)
+
+
+def test_load_weather_years(weather, tmp_path):
+    Settings.add('input_curves_folder', str(tmp_path))
+    folder = tmp_path / 'region'
+    folder.mkdir()
+
+    for year in [1988, 1987]:
+        weather['temp'].loc[year].to_csv(folder / f'temperature_{year}.csv', index=False, header=False)
+        weather['irr'].loc[year].to_csv(folder / f'irradiation_{year}.csv', index=False, header=False)
+    weather['therm'].to_csv(folder / 'thermostat.csv', index=False)
+
+    generator = load_weather_years('region')
+
+    assert generator.years == [1987, 1988]
+    assert generator.can_generate_house
+    assert not generator.can_generate_buildings_agriculture
+
+
+def test_worker_pool_uses_the_settings_of_this_process(settings):
+    settings.add('heat_demand_cache', 'set at runtime')
+
+    # Spawned workers (the default on Windows and macOS) load the settings from file again
+    with worker_pool(1, multiprocessing.get_context('spawn')) as pool:
+        assert pool.submit(Settings.get, 'heat_demand_cache').result() == 'set at runtime'
@@ -0,0 +1,121 @@
+import os
+
+import numpy as np
+
+from helpers.Curves import Curve
+from helpers.curve_store import CurveStore
+from helpers.heat_file_utils import read_heat_demand_input, contains_heating_profiles
+from helpers.heat_demand.config import insulation_config
+
+
+def test_put_and_get(tmp_path):
+    store = CurveStore(tmp_path / 'store')
+    store.put({'first': np.arange(8760), 'second': np.ones(10)})
+
+    reopened = CurveStore(tmp_path / 'store')
+    assert reopened.exists()
+    assert set(reopened.keys()) == {'first', 'second'}
+    np.testing.assert_array_equal(reopened.get('first'), np.arange(8760))
+    assert isinstance(reopened.get('first'), np.memmap)
+    assert reopened.get('second').dtype == np.float64
+
+
+def test_put_replaces_and_compact_shrinks(tmp_path):
+    store = CurveStore(tmp_path)
+    store.put({'curve': np.zeros(100)})
+    store.put({'curve': np.ones(100)})
+
+    np.testing.assert_array_equal(store.get('curve'), np.ones(100))
+    assert store.data_path.stat().st_size == 1600
+
+    store.compact()
+
+    np.testing.assert_array_equal(store.get('curve'), np.ones(100))
+    assert store.data_path.stat().st_size == 800
+
+
+def test_compact_never_changes_files_readers_use(tmp_path):
+    store = CurveStore(tmp_path)
+    store.put({'curve': np.zeros(100)})
+    store.put({'curve': np.ones(100)})
+    reader = CurveStore(tmp_path)
+    curve = reader.get('curve')
+
+    store.compact()
+    store.put({'other': np.arange(10)})
+
+    # The reader keeps the curve it mapped, new readers get the compacted store
+    np.testing.assert_array_equal(curve, np.ones(100))
+    reopened = CurveStore(tmp_path)
+    np.testing.assert_array_equal(reopened.get('curve'), np.ones(100))
+    np.testing.assert_array_equal(reopened.get('other'), np.arange(10))
+    assert sorted(path.name for path in tmp_path.glob('*.f64')) == [reopened.data_path.name]
+    assert not list(tmp_path.glob('*.tmp'))
+
+
+def test_reads_and_compacts_stores_with_a_plain_index(tmp_path):
+    (tmp_path / 'curves.f64').write_bytes(np.arange(20, dtype='<f8').tobytes())
+    (tmp_path / 'curves.json').write_text('{"curve": [10, 10]}')
+
+    store = CurveStore(tmp_path)
+    np.testing.assert_array_equal(store.get('curve'), np.arange(10, 20))
+
+    store.compact()
+
+    np.testing.assert_array_equal(CurveStore(tmp_path).get('curve'), np.arange(10, 20))
+    assert not (tmp_path / 'curves.f64').exists()
+
+
+def test_pack_and_unpack_csv_folder(tmp_path):
+    (tmp_path / 'curve.csv').write_text('\n'.join(str(i / 2) for i in range(8760)))
+    (tmp_path / 'thermostat.csv').write_text('low,medium,high\n1,2,3\n')
+
+    store = CurveStore.from_csv_folder(tmp_path)
+
+    assert store.keys() == ['curve']
+    assert store.get('curve')[3] == 1.5
+
+    store.to_csv_folder(tmp_path / 'unpacked')
+    assert (tmp_path / 'unpacked' / 'curve.csv').read_text().split('\n')[:2] == ['0.0', '0.5']
+
+
+def test_heat_demand_input_from_store(tmp_path, settings):
+    settings.add('input_curves_folder', str(tmp_path))
+    profiles = {key: np.full(8760, index, dtype=float) for index, key in enumerate(insulation_config.curve_keys)}
+    CurveStore(tmp_path / 'region').put({'temperature': np.arange(8760), **profiles})
+
+    np.testing.assert_array_equal(read_heat_demand_input('region', 'temperature'), np.arange(8760))
+    assert contains_heating_profiles('region')
+
+
+def test_heat_demand_input_prefers_a_newer_csv(tmp_path, settings, capsys):
+    settings.add('input_curves_folder', str(tmp_path))
+    store = CurveStore(tmp_path / 'region')
+    store.put({'temperature': np.zeros(8760)})
+    csv_path = tmp_path / 'region' / 'temperature.csv'
+    csv_path.write_text('\n'.join(['1.0'] * 8760))
+
+    # The csv was edited after the store was packed
+    store_time = store.index_path.stat().st_mtime
+    os.utime(csv_path, (store_time + 10, store_time + 10))
+    assert read_heat_demand_input('region', 'temperature')[0] == 1.0
+
+    # Unless the store is used explicitly, which warns about the newer csv
+    settings.add('curve_store', True)
+    assert read_heat_demand_input('region', 'temperature')[0] == 0.0
+    assert 'temperature.csv was changed after the curve store' in capsys.readouterr().out
+
+    # A store packed after the csv was changed is used
+    settings.add('curve_store', False)
+    os.utime(csv_path, (store_time - 10, store_time - 10))
+    assert read_heat_demand_input('region', 'temperature')[0] == 0.0
+
+
+def test_curve_to_store(tmp_path, settings):
+    settings.add('output_curves_folder', str(tmp_path))
+    settings.add('curve_store', True)
+
+    Curve('heat', np.arange(8760)).to_csv('scenario')
+
+    assert not (tmp_path / 'scenario' / 'heat.csv').exists()
+    np.testing.assert_array_equal(CurveStore(tmp_path / 'scenario').get('heat'), np.arange(8760))
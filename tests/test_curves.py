@@ -0,0 +1,35 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from helpers.Curves import CurveFile
+from helpers.ETM_API import serialize_curve
+
+
+@pytest.fixture
+def curves_folder(tmp_path, settings):
+    settings.add('input_curves_folder', str(tmp_path))
+    return tmp_path
+
+
+def test_curve_file_from_csv(curves_folder):
+    values = np.arange(8760 * 2, dtype=float).reshape(8760, 2) / 4
+    pd.DataFrame(values, columns=['first', 'second']).to_csv(curves_folder / 'prices.csv', index=False)
+
+    curves = {curve.key: curve for curve in CurveFile.from_csv('prices').curves}
+
+    assert set(curves) == {'first', 'second'}
+    assert curves['second'].data.dtype == np.float64
+    assert curves['second'].data.flags['C_CONTIGUOUS']
+    np.testing.assert_array_equal(curves['second'].data, values[:, 1])
+    assert serialize_curve(curves['first'].data).split('\n')[:2] == ['0.0', '0.5']
+
+
+@pytest.mark.parametrize('bad_value', ['abc', '', 'inf'])
+def test_curve_file_with_invalid_values(curves_folder, bad_value):
+    values = ['1.0'] * 8760
+    values[100] = bad_value
+    (curves_folder / 'prices.csv').write_text('first,second\n' + '\n'.join(f'{v},2' for v in values))
+
+    with pytest.raises(SystemExit):
+        CurveFile.from_csv('prices')
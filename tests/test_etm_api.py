@@ -1,12 +1,18 @@
 '''Tests for the ETM_API class'''
 
 from email.policy import default
+import io
+import numpy as np
+import pandas as pd
 import pytest
+import requests
 from unittest import mock
 from pathlib import Path
 
-from helpers.ETM_API import SessionWithUrlBase, ETM_API
+from helpers.ETM_API import (SessionWithUrlBase, ETM_API, DOWNLOAD_CHUNK_SIZE, serialize_curve,
+    user_values_diff)
 from helpers.Curves import Curve
+from helpers.curve_manifest import CurveManifest
 from helpers.settings import Settings
 from helpers.heat_demand.config import insulation_config
 
@@ -138,3 +144,372 @@ def test_create_etm_scenario_with_falsey_end_year(default_api, default_scenario,
     default_api.create_etm_scenario()
 
     assert default_scenario.end_year == 2050
+
+
+def test_session_pools_connections(settings):
+    settings.add('connection_pool_size', 4)
+    settings.add('connection_retries', 2)
+
+    session = SessionWithUrlBase(BASE_URL)
+    adapter = session.get_adapter(BASE_URL)
+
+    assert adapter._pool_maxsize == 4
+    assert adapter.max_retries.total == 2
+
+
+def test_session_keeps_connections_alive(requests_mock, settings):
+    requests_mock.get(BASE_URL + '/scenarios/1', json={})
+
+    settings.add('connection_keep_alive', True)
+    SessionWithUrlBase(BASE_URL).get('/scenarios/1')
+    assert requests_mock.last_request.headers.get('Connection') != 'close'
+
+    settings.add('connection_keep_alive', False)
+    SessionWithUrlBase(BASE_URL).get('/scenarios/1')
+    assert requests_mock.last_request.headers['Connection'] == 'close'
+
+
+def test_serialize_curve():
+    assert serialize_curve(pd.Series(['1', '2.5', '-0.125'])) == '1\n2.5\n-0.125'
+    assert serialize_curve(np.array([0.1, 3.0])) == '0.1\n3.0'
+    assert serialize_curve(np.array([1, -2])) == '1\n-2'
+    assert serialize_curve(pd.Series([1, 2], dtype=float)) == '1.0\n2.0'
+    assert serialize_curve(np.array([1e-7, 123456789.5])) == '1e-07\n123456789.5'
+
+
+def test_session_retries_curve_uploads(settings):
+    settings.add('connection_retries', 2)
+
+    retries = SessionWithUrlBase(BASE_URL).get_adapter(BASE_URL).max_retries
+
+    assert retries.is_retry('PUT', 503)
+    assert not retries.is_retry('POST', 503)
+    assert not retries.is_retry('PUT', 422)
+
+
+def test_upload_custom_curves_has_one_retry_layer(default_api, default_scenario, requests_mock,
+    curve_manifest, settings):
+    '''Retries are left to the adapter of the session, the upload itself sends once'''
+    settings.add('skip_unchanged_curves', False)
+    settings.add('connection_retries', 2)
+
+    default_scenario.id = 12345
+    default_api.scenario = default_scenario
+
+    endpoint = f'{BASE_URL}/scenarios/{default_scenario.id}/custom_curves/'
+    requests_mock.put(endpoint + 'failing', [{'status_code': 500}, {'json': {}, 'status_code': 200}])
+
+    with pytest.raises(SystemExit):
+        default_api.upload_custom_curves([('failing', np.zeros(8760), 'failing.csv')])
+
+    assert requests_mock.call_count == 1
+
+
+def curve_listing(key, date='2026-01-01T00:00:00Z'):
+    '''An entry in the custom curves listing of the engine'''
+    return {'key': key, 'attached': True, 'name': f'{key}.csv', 'size': 8760, 'date': date}
+
+
+def test_upload_custom_curves_skips_unchanged(default_api, default_scenario, requests_mock,
+    curve_manifest, settings):
+    settings.add('skip_unchanged_curves', True)
+
+    default_scenario.id = 12345
+    default_api.scenario = default_scenario
+
+    endpoint = f'{BASE_URL}/scenarios/{default_scenario.id}/custom_curves'
+    requests_mock.get(endpoint, json=[curve_listing('unchanged'), curve_listing('changed')])
+    for key in ['unchanged', 'changed', 'detached']:
+        requests_mock.put(f'{endpoint}/{key}', json=curve_listing(key))
+
+    uploads = [
+        ('unchanged', np.ones(8760), 'unchanged.csv'),
+        ('changed', np.ones(8760), 'changed.csv'),
+        ('detached', np.ones(8760), 'detached.csv')
+    ]
+    default_api.upload_custom_curves(uploads)
+    assert requests_mock.call_count == 4
+
+    requests_mock.reset_mock()
+    uploads[1] = ('changed', np.zeros(8760), 'changed.csv')
+    default_api.upload_custom_curves(uploads)
+
+    uploaded = sorted(r.path.split('/')[-1] for r in requests_mock.request_history if r.method == 'PUT')
+    assert uploaded == ['changed', 'detached']
+    assert CurveManifest(curve_manifest.path).is_uploaded(
+        BASE_URL, 12345, 'changed', CurveManifest.fingerprint('\n'.join(['0.0'] * 8760)),
+        curve_listing('changed'))
+
+
+@pytest.mark.parametrize('listed_key, skipped', [
+    ('weather/air_temperature', True),
+    ('air_temperature', False)
+])
+def test_upload_custom_curves_matches_prefixed_keys(default_api, default_scenario, requests_mock,
+    settings, listed_key, skipped):
+    '''A prefixed curve is only skipped when the engine lists it under the same, prefixed key'''
+    settings.add('skip_unchanged_curves', True)
+
+    default_scenario.id = 12345
+    default_api.scenario = default_scenario
+
+    endpoint = f'{BASE_URL}/scenarios/{default_scenario.id}/custom_curves'
+    requests_mock.get(endpoint, json=[curve_listing(listed_key)])
+    requests_mock.put(f'{endpoint}/weather/air_temperature', json=curve_listing(listed_key))
+
+    uploads = [('weather/air_temperature', np.ones(8760), 'air_temperature')]
+    default_api.upload_custom_curves(uploads)
+    requests_mock.reset_mock()
+    default_api.upload_custom_curves(uploads)
+
+    assert [r.method for r in requests_mock.request_history] == ['GET'] if skipped else ['GET', 'PUT']
+
+
+def test_upload_custom_curves_checks_the_engine(default_api, default_scenario, requests_mock,
+    curve_manifest, settings):
+    '''Curves changed on the engine, or uploaded to another engine, are uploaded again'''
+    settings.add('skip_unchanged_curves', True)
+
+    default_scenario.id = 12345
+    default_api.scenario = default_scenario
+
+    endpoint = f'{BASE_URL}/scenarios/{default_scenario.id}/custom_curves'
+    requests_mock.get(endpoint, json=[curve_listing('curve')])
+    requests_mock.put(f'{endpoint}/curve', json=curve_listing('curve'))
+
+    uploads = [('curve', np.ones(8760), 'curve.csv')]
+    default_api.upload_custom_curves(uploads)
+
+    requests_mock.get(endpoint, json=[curve_listing('curve', date='2026-02-01T00:00:00Z')])
+    default_api.upload_custom_curves(uploads)
+    assert requests_mock.request_history[-1].method == 'PUT'
+
+    other_engine = 'http://other.session'
+    default_api.session.url_base = other_engine
+    requests_mock.get(f'{other_engine}/scenarios/12345/custom_curves', json=[curve_listing('curve')])
+    requests_mock.put(f'{other_engine}/scenarios/12345/custom_curves/curve', json=curve_listing('curve'))
+    default_api.upload_custom_curves(uploads)
+    assert requests_mock.request_history[-1].method == 'PUT'
+
+
+def test_user_values_diff():
+    current = {'unchanged': 10.0, 'changed': 5.0, 'to_reset': 3.0, 'untouched': 1.0}
+    desired = {'unchanged': 10, 'changed': 6.0, 'new': 2.0, 'to_reset': 'reset', 'already_default': 'reset'}
+
+    assert user_values_diff(desired, current) == {'changed': 6.0, 'new': 2.0, 'to_reset': 'reset'}
+
+
+def test_update_inputs_sends_only_changed_sliders(default_api, default_scenario, requests_mock, settings):
+    settings.add('diff_slider_updates', True)
+
+    default_scenario.id = 12345
+    default_api.scenario = default_scenario
+    endpoint = f'{BASE_URL}/scenarios/{default_scenario.id}'
+    requests_mock.get(endpoint, json={'user_values': {'a': 1.0, 'b': 2.0}})
+    requests_mock.put(endpoint, json={})
+
+    default_scenario.user_values = {'a': 1.0, 'b': 3.0}
+    default_api.update_inputs()
+    assert requests_mock.last_request.json() == {'scenario': {'user_values': {'b': 3.0}}}
+
+    requests_mock.reset_mock()
+    default_scenario.user_values = {'a': 1.0, 'b': 2.0}
+    default_api.update_inputs()
+    assert [r.method for r in requests_mock.request_history] == ['GET']
+
+
+def test_update_merges_properties_sliders_and_queries(default_api, default_scenario, requests_mock, settings):
+    settings.add('merge_engine_requests', True)
+    settings.add('diff_slider_updates', False)
+
+    default_scenario.id = 12345
+    default_scenario.curve_file = None
+    default_scenario.user_values = {'a': 1.0}
+    default_api.scenario = default_scenario
+    requests_mock.put(
+        f'{BASE_URL}/scenarios/{default_scenario.id}',
+        json={'gqueries': {'q': {'present': 1.0, 'future': 2.0, 'unit': 'PJ'}}}
+    )
+
+    assert default_api.update({}, ['q'])
+
+    assert requests_mock.call_count == 1
+    put_data = requests_mock.last_request.json()
+    assert put_data['scenario']['user_values'] == {'a': 1.0}
+    assert 'keep_compatible' in put_data['scenario']
+    assert put_data['gqueries'] == ['q']
+    assert default_scenario.query_results.loc['q', 'future'] == 2.0
+
+
+def test_update_does_not_query_before_uploads(default_api, default_scenario, requests_mock, settings):
+    settings.add('merge_engine_requests', True)
+    settings.add('diff_slider_updates', False)
+
+    default_scenario.id = 12345
+    default_scenario.curve_file = None
+    default_scenario.heat_network_orders = {'lt': ['a']}
+    default_api.scenario = default_scenario
+    requests_mock.put(f'{BASE_URL}/scenarios/{default_scenario.id}', json={})
+    requests_mock.put(f'{BASE_URL}/scenarios/{default_scenario.id}/heat_network_order', json={})
+
+    assert not default_api.update({}, ['q'])
+    assert 'gqueries' not in requests_mock.request_history[0].json()
+
+
+def gquery_callback(request, context):
+    '''Answers gqueries like the engine, failing when a query is called bad'''
+    queries = request.json()['gqueries']
+    if 'bad' in queries:
+        context.status_code = 422
+        return {'errors': ['Gquery bad does not exist']}
+
+    return {'gqueries': {
+        query: {'present': 0.0, 'future': float(query[1:]), 'unit': 'PJ'} for query in queries
+    }}
+
+
+def test_query_in_chunks(default_api, default_scenario, requests_mock, settings):
+    settings.add('query_chunk_size', 3)
+    settings.add('concurrent_query_chunks', 2)
+
+    default_scenario.id = 12345
+    default_api.scenario = default_scenario
+    requests_mock.put(f'{BASE_URL}/scenarios/{default_scenario.id}', json=gquery_callback)
+
+    queries = [f'q{i}' for i in range(10, 0, -1)]
+    results = default_api.query(queries)
+
+    assert requests_mock.call_count == 4
+    assert list(results.index) == queries
+    assert list(results['future']) == list(range(10, 0, -1))
+
+
+def test_query_in_chunks_isolates_failing_query(default_api, default_scenario, requests_mock, settings):
+    settings.add('query_chunk_size', 4)
+
+    default_scenario.id = 12345
+    default_api.scenario = default_scenario
+    requests_mock.put(f'{BASE_URL}/scenarios/{default_scenario.id}', json=gquery_callback)
+
+    queries = ['q1', 'q2', 'q3', 'bad', 'q5', 'q6']
+    results = default_api.query(queries)
+
+    assert list(results.index) == queries
+    assert np.isnan(results.loc['bad', 'future'])
+    assert results.loc['q6', 'future'] == 6.0
+    # The failing chunk of four is split in two, and the failing half in two again
+    assert requests_mock.call_count == 6
+
+
+@pytest.mark.parametrize('failure', [
+    {'status_code': 503, 'json': {'errors': ['Service unavailable']}},
+    {'exc': requests.exceptions.ReadTimeout}
+])
+def test_query_in_chunks_fails_chunks_without_splitting(default_api, default_scenario, requests_mock,
+    settings, failure):
+    '''Server errors and timeouts are retried by the session, they fail the whole chunk'''
+    settings.add('query_chunk_size', 4)
+
+    default_scenario.id = 12345
+    default_api.scenario = default_scenario
+
+    def respond(request, context):
+        if 'q1' in request.json()['gqueries']:
+            if 'exc' in failure:
+                raise failure['exc']
+            context.status_code = failure['status_code']
+            return failure['json']
+
+        return gquery_callback(request, context)
+
+    requests_mock.put(f'{BASE_URL}/scenarios/{default_scenario.id}', json=respond)
+
+    queries = ['q1', 'q2', 'q3', 'q4', 'q5', 'q6']
+    results = default_api.query(queries)
+
+    assert all(np.isnan(results.loc[query, 'future']) for query in ['q1', 'q2', 'q3', 'q4'])
+    assert list(results.loc[['q5', 'q6'], 'future']) == [5.0, 6.0]
+    assert requests_mock.call_count == 2
+
+
+def test_stream_data_download(default_api, default_scenario, requests_mock, tmp_path):
+    default_api.scenario = default_scenario
+    content = b'key,value\n' + b''.join(f'row_{i},{i}.5\n'.encode() for i in range(20000))
+    requests_mock.get(f'{BASE_URL}/scenarios/{default_scenario.id}/curves/merit_order', content=content)
+
+    path = tmp_path / 'merit_order.csv'
+    size = default_api.stream_data_download('merit_order', path, hourly=True)
+
+    assert size == len(content)
+    assert path.read_bytes() == content
+    assert not (tmp_path / 'merit_order.csv.part').exists()
+
+
+class BrokenStream(io.RawIOBase):
+    '''A response body that fails after its first chunk'''
+    def __init__(self):
+        self.data = b'key,value\n' * 2 * DOWNLOAD_CHUNK_SIZE
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if not self.data:
+            raise ConnectionError('Connection lost')
+
+        size = min(len(buffer), len(self.data))
+        buffer[:size], self.data = self.data[:size], self.data[size:]
+        return size
+
+
+def test_stream_data_download_removes_part_file_on_failure(default_api, default_scenario,
+                                                           requests_mock, tmp_path):
+    default_api.scenario = default_scenario
+    requests_mock.get(f'{BASE_URL}/scenarios/{default_scenario.id}/energy_flow', body=BrokenStream())
+
+    with pytest.raises(Exception):
+        default_api.stream_data_download('energy_flow', tmp_path / 'energy_flow.csv')
+
+    assert list(tmp_path.iterdir()) == []
+
+
+@pytest.mark.parametrize('content', [b'<!DOCTYPE html><html></html>', b'', b'\nvalue'])
+def test_stream_data_download_with_invalid_content(default_api, default_scenario, requests_mock,
+                                                    tmp_path, content):
+    default_api.scenario = default_scenario
+    requests_mock.get(f'{BASE_URL}/scenarios/{default_scenario.id}/energy_flow', content=content)
+
+    with pytest.raises(SystemExit):
+        default_api.stream_data_download('energy_flow', tmp_path / 'energy_flow.csv')
+
+    assert not (tmp_path / 'energy_flow.csv').exists()
+
+
+def test_get_custom_curves(default_api, default_scenario, requests_mock):
+    default_api.scenario = default_scenario
+    endpoint = f'{BASE_URL}/scenarios/{default_scenario.id}/custom_curves'
+    requests_mock.get(f'{endpoint}?include_internal=true', json=[
+        {'key': 'first', 'attached': True},
+        {'key': 'unattached', 'attached': False},
+        {'key': 'second', 'attached': True}
+    ])
+    requests_mock.get(f'{endpoint}/first.csv', text='\n'.join(['1.5'] * 8760))
+    requests_mock.get(f'{endpoint}/second.csv', text='\n'.join(str(i) for i in range(8760)))
+
+    df = default_api.get_custom_curves()
+
+    assert list(df.columns) == ['first', 'second']
+    assert df.shape == (8760, 2)
+    assert (df['first'] == 1.5).all()
+    np.testing.assert_array_equal(df['second'], np.arange(8760))
+
+
+@pytest.mark.parametrize('text', ['\n'.join(['1.0'] * 10), '\n'.join(['abc'] * 8760)])
+def test_get_custom_curves_with_invalid_curve(default_api, default_scenario, requests_mock, text):
+    default_api.scenario = default_scenario
+    endpoint = f'{BASE_URL}/scenarios/{default_scenario.id}/custom_curves'
+    requests_mock.get(f'{endpoint}?include_internal=true', json=[{'key': 'first', 'attached': True}])
+    requests_mock.get(f'{endpoint}/first.csv', text=text)
+
+    with pytest.raises(SystemExit):
+        default_api.get_custom_curves()
@@ -0,0 +1,80 @@
+import pandas as pd
+import pytest
+
+from helpers.file_helpers import (write_output, write_columnar, typed_columns, hourly_dataset_path,
+    DEFAULT_CSV_FORMAT)
+from helpers.settings import Settings
+
+
+@pytest.fixture
+def output_folder(tmp_path, settings):
+    settings.add('output_file_folder', str(tmp_path))
+    return tmp_path
+
+
+@pytest.fixture
+def outcomes():
+    return pd.DataFrame(
+        {'scenario': [1.0, 2.5], 'unit': ['PJ', 'MT'], 'mixed': [1, 'reset']},
+        index=pd.Index(['query_a', 'query_b'], name='query')
+    )
+
+
+def test_write_output_csv(output_folder, outcomes):
+    Settings.add('output_format', 'csv')
+
+    path = write_output(outcomes, 'outcomes', index=True)
+
+    assert path == output_folder / 'outcomes.csv'
+    assert pd.read_csv(path, index_col=0).loc['query_b', 'unit'] == 'MT'
+
+
+def test_write_output_csv_format(output_folder, outcomes):
+    Settings.add('output_format', 'csv')
+    Settings.add('csv_separator', ';')
+    Settings.add('decimal_seperator', ',')
+
+    localized = write_output(outcomes, 'localized')
+    default = write_output(outcomes, 'default', **DEFAULT_CSV_FORMAT)
+
+    assert localized.read_text().splitlines()[1] == '1,0;PJ;1'
+    assert default.read_text().splitlines()[1] == '1.0,PJ,1'
+
+
+@pytest.mark.parametrize('file_format', ['parquet', 'feather'])
+def test_write_output_columnar(output_folder, outcomes, file_format):
+    pytest.importorskip('pyarrow')
+    Settings.add('output_format', file_format)
+
+    path = write_output(outcomes, 'outcomes', index=True)
+
+    assert path == output_folder / f'outcomes.{file_format}'
+    df = pd.read_parquet(path) if file_format == 'parquet' else pd.read_feather(path)
+    assert list(df.columns) == ['query', 'scenario', 'unit', 'mixed']
+    assert df['scenario'].dtype == float
+    assert list(df['mixed']) == ['1', 'reset']
+
+
+def test_typed_columns_flattens_multi_index():
+    df = pd.DataFrame([[1, '2']], columns=pd.MultiIndex.from_tuples([('title', 1), ('other', 2)]),
+        dtype=object)
+
+    typed = typed_columns(df)
+
+    assert list(typed.columns) == ['title_1', 'other_2']
+    assert typed['other_2'].dtype == 'int64'
+
+
+def test_hourly_dataset_is_partitioned(output_folder):
+    pytest.importorskip('pyarrow')
+    Settings.add('output_format', 'parquet')
+
+    for scenario in ['first', 'second']:
+        path = hourly_dataset_path('merit_order', scenario)
+        write_columnar(pd.DataFrame({'hour': [0, 1], 'value': [1.0, 2.0]}), path, 'parquet')
+
+    df = pd.read_parquet(output_folder / 'hourly_data')
+
+    assert len(df) == 4
+    assert set(df['scenario']) == {'first', 'second'}
+    assert set(df['download']) == {'merit_order'}
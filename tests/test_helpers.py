@@ -0,0 +1,54 @@
+import logging
+import sys
+import threading
+
+from helpers.helpers import grouped_output
+
+
+def test_grouped_output_restores_streams():
+    stdout = sys.stdout
+    handler = logging.StreamHandler(sys.stderr)
+    logging.getLogger().addHandler(handler)
+
+    try:
+        with grouped_output():
+            assert sys.stdout is not stdout
+            assert handler.stream is not sys.stderr
+
+        assert sys.stdout is stdout
+        assert handler.stream is sys.stderr
+    finally:
+        logging.getLogger().removeHandler(handler)
+
+
+def test_grouped_output_groups_prints_and_logging(capsys):
+    logger = logging.getLogger('grouped_output_test')
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    logger.addHandler(handler)
+    logger.propagate = False
+
+    barrier = threading.Barrier(2)
+
+    def task(name):
+        with grouped_output():
+            for line in range(3):
+                print(f'{name} print {line}')
+                logger.warning(f'{name} log {line}')
+                barrier.wait()
+
+    try:
+        threads = [threading.Thread(target=task, args=(name,)) for name in ('first', 'second')]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        logger.removeHandler(handler)
+
+    lines = capsys.readouterr().out.splitlines()
+    for name in ('first', 'second'):
+        start = lines.index(f'{name} print 0')
+        assert lines[start:start + 6] == [
+            f'{name} {kind} {line}' for line in range(3) for kind in ('print', 'log')
+        ]
@@ -0,0 +1,136 @@
+import time
+
+import pytest
+
+from helpers.ETM_API import SessionWithUrlBase, ETM_API
+from helpers.helpers import process_arguments
+from helpers.response_cache import ResponseCache
+from helpers.settings import Settings
+
+BASE_URL = 'http://fake.session'
+
+
+@pytest.fixture
+def cache_settings(tmp_path, settings):
+    settings.add('response_cache', True)
+    settings.add('response_cache_folder', str(tmp_path))
+    return tmp_path
+
+
+@pytest.fixture
+def scenario_engine(requests_mock):
+    engine = {'updated_at': '2024-01-01T00:00:00Z', 'etag': None}
+
+    def show(request, context):
+        if engine['etag']:
+            context.headers['ETag'] = engine['etag']
+        return {'id': 1, 'updated_at': engine['updated_at']}
+
+    engine['scenario'] = requests_mock.get(f'{BASE_URL}/scenarios/1', json=show)
+    engine['curves'] = requests_mock.get(f'{BASE_URL}/scenarios/1/custom_curves', json=[{'key': 'a'}])
+    requests_mock.put(f'{BASE_URL}/scenarios/1', json={})
+
+    return engine
+
+
+def test_reuses_responses_of_unchanged_scenarios(cache_settings, scenario_engine):
+    first = SessionWithUrlBase(BASE_URL).get('/scenarios/1/custom_curves')
+    second = SessionWithUrlBase(BASE_URL).get('/scenarios/1/custom_curves')
+
+    assert first.json() == second.json() == [{'key': 'a'}]
+    assert scenario_engine['curves'].call_count == 1
+
+
+def test_refetches_after_scenario_changed(cache_settings, scenario_engine):
+    session = SessionWithUrlBase(BASE_URL)
+    session.get('/scenarios/1/custom_curves')
+
+    session.put('/scenarios/1', json={})
+    scenario_engine['updated_at'] = '2024-01-02T00:00:00Z'
+    session.get('/scenarios/1/custom_curves')
+
+    assert scenario_engine['curves'].call_count == 2
+    assert session.cache.misses == 2
+
+
+def test_scenario_lookup_answers_requests_for_the_scenario(cache_settings, scenario_engine):
+    session = SessionWithUrlBase(BASE_URL)
+
+    assert session.get('/scenarios/1').json()['id'] == 1
+    assert session.get('/scenarios/1').json()['id'] == 1
+    assert scenario_engine['scenario'].call_count == 1
+    assert (session.cache.hits, session.cache.misses) == (1, 1)
+
+
+def test_refetches_after_the_etag_of_the_scenario_changed(cache_settings, scenario_engine):
+    scenario_engine['etag'] = '"1"'
+    SessionWithUrlBase(BASE_URL).get('/scenarios/1/custom_curves')
+    SessionWithUrlBase(BASE_URL).get('/scenarios/1/custom_curves')
+
+    scenario_engine['etag'] = '"2"'
+    SessionWithUrlBase(BASE_URL).get('/scenarios/1/custom_curves')
+
+    assert scenario_engine['curves'].call_count == 2
+
+
+def test_revalidates_other_responses_with_etag(cache_settings, requests_mock):
+    responses = [
+        {'json': {'version': 1}, 'headers': {'ETag': '"v1"'}},
+        {'status_code': 304, 'headers': {'ETag': '"v1"'}}
+    ]
+    mock = requests_mock.get(f'{BASE_URL}/areas', responses)
+
+    SessionWithUrlBase(BASE_URL).get('/areas')
+    response = SessionWithUrlBase(BASE_URL).get('/areas')
+
+    assert response.json() == {'version': 1}
+    assert mock.last_request.headers['If-None-Match'] == '"v1"'
+
+
+def test_streams_cached_data_downloads(cache_settings, scenario_engine, requests_mock, tmp_path,
+                                       default_scenario):
+    default_scenario.id = 1
+    content = b'key,value\na,1\n'
+    download = requests_mock.get(f'{BASE_URL}/scenarios/1/energy_flow', content=content)
+
+    for _ in range(2):
+        api = ETM_API(SessionWithUrlBase(BASE_URL), default_scenario)
+        assert api.stream_data_download('energy_flow', tmp_path / 'energy_flow.csv') == len(content)
+        assert (tmp_path / 'energy_flow.csv').read_bytes() == content
+
+    assert download.call_count == 1
+
+
+def test_does_not_cache_large_streamed_downloads(cache_settings, scenario_engine, requests_mock, tmp_path,
+                                                 default_scenario, settings):
+    settings.add('response_cache_entry_size', 0.001)
+    default_scenario.id = 1
+    content = b'key,value\n' + b'a,1\n' * 1000
+    download = requests_mock.get(f'{BASE_URL}/scenarios/1/energy_flow', content=content)
+
+    for _ in range(2):
+        api = ETM_API(SessionWithUrlBase(BASE_URL), default_scenario)
+        assert api.stream_data_download('energy_flow', tmp_path / 'energy_flow.csv') == len(content)
+        assert (tmp_path / 'energy_flow.csv').read_bytes() == content
+
+    assert download.call_count == 2
+
+
+def test_expired_and_evicted_entries(tmp_path):
+    cache = ResponseCache(tmp_path / 'responses.sqlite', ttl=1, max_size=0.00002)
+    cache.put('a', ResponseCache.build_response('http://a', 200, {}, b'x' * 15))
+    time.sleep(0.01)
+    cache.put('b', ResponseCache.build_response('http://b', 200, {}, b'x' * 15))
+
+    assert cache.get('a') is None
+    assert cache.get('b')['response'].content == b'x' * 15
+
+    cache.ttl = 0
+    assert cache.get('b') is None
+
+
+def test_no_cache_argument(cache_settings):
+    process_arguments(['script.py', '--no-cache'])
+
+    assert not Settings.get('response_cache')
+    assert SessionWithUrlBase(BASE_URL).cache is None
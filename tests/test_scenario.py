@@ -1,9 +1,13 @@
+import threading
+import time
 
 import pytest
+import numpy as np
 import pandas as pd
 from unittest import mock
 from pathlib import Path
 
+from helpers.ETM_API import SessionWithUrlBase
 from helpers.settings import Settings
 from helpers.Curves import Curve
 from helpers.Scenario import Scenario, ScenarioCollection
@@ -70,6 +74,18 @@ def test_collection_export():
     outcome_path.unlink()
 
 
+def test_collection_export_to_nested_target(tmp_path, settings):
+    settings.add('input_file_folder', 'tests/fixtures/')
+    settings.add('output_file_folder', str(tmp_path))
+    settings.add('output_format', 'csv')
+    collection = ScenarioCollection.from_csv()
+
+    collection.export_scenario_outcomes('subdir/outcomes.csv')
+
+    assert (tmp_path / 'subdir' / 'outcomes.csv').exists()
+    assert not (tmp_path / 'outcomes.csv').exists()
+
+
 def test_query_and_export(monkeypatch):
     Settings.add('input_file_folder', 'tests/fixtures/')
     Settings.add('output_file_folder', 'tests/fixtures/')
@@ -112,3 +128,98 @@ def test_query_and_export(monkeypatch):
     assert 'DE_Germany' in outcome.columns
     assert len(outcome.columns) == 4
     outcome_path.unlink()
+
+
+def test_process_concurrently_groups_output(capsys):
+    collection = ScenarioCollection([
+        Scenario(pd.Series({'short_name': name})) for name in ['first', 'second', 'third']
+    ])
+
+    def process_scenario(scenario):
+        print(f'start {scenario.short_name}')
+        time.sleep(0.01)
+        print(f'end {scenario.short_name}')
+        scenario.query_results = scenario.short_name
+
+    collection.process(process_scenario, max_workers=3)
+
+    output = capsys.readouterr().out.splitlines()
+    assert sorted(output) == sorted(f'{step} {name}' for name in ['first', 'second', 'third'] for step in ['start', 'end'])
+    for start, end in zip(output[::2], output[1::2]):
+        assert start.split()[1] == end.split()[1]
+    assert [scenario.query_results for scenario in collection] == ['first', 'second', 'third']
+
+
+def test_process_concurrently_stops_on_exit():
+    collection = ScenarioCollection([Scenario(pd.Series({'short_name': 'failing'}))])
+
+    def process_scenario(scenario):
+        raise SystemExit()
+
+    with pytest.raises(SystemExit):
+        collection.process(process_scenario, max_workers=2)
+
+
+
+def test_export_data_downloads_concurrently(default_scenario, tmp_path, capsys, settings):
+    settings.add('output_file_folder', str(tmp_path))
+    settings.add('concurrent_downloads', 4)
+    settings.add('stream_data_downloads', True)
+
+    # Only passes when all four downloads are in progress at the same time
+    all_downloading = threading.Barrier(4, timeout=5)
+
+    def download(name, path, hourly=False):
+        all_downloading.wait()
+        path.write_bytes(f'{name},{hourly}\n'.encode())
+        return path.stat().st_size
+
+    default_scenario.setup_connection(SessionWithUrlBase('http://fake.session'))
+    default_scenario.api.stream_data_download = download
+
+    default_scenario.export_data_downloads(
+        {'annual_data': ['energy_flow', 'application_demands'], 'hourly_data': ['merit_order', 'heat']})
+
+    for name, hourly in [('energy_flow', False), ('application_demands', False),
+                         ('merit_order', True), ('heat', True)]:
+        path = tmp_path / default_scenario.short_name / f'{default_scenario.short_name}_{name}.csv'
+        assert path.read_bytes() == f'{name},{hourly}\n'.encode()
+
+    assert 'Downloaded 4 files' in capsys.readouterr().out
+
+
+def test_query_all_requires_unique_short_names(monkeypatch, settings):
+    settings.add('input_file_folder', 'tests/fixtures/')
+    collection = ScenarioCollection.from_csv('regional_overview_scenarios')
+    collection.collection[1].short_name = collection.collection[0].short_name
+    monkeypatch.setattr(Scenario, "query", lambda scenario, query_list: pytest.fail('queried'))
+
+    with pytest.raises(SystemExit):
+        collection.query_all(['a'])
+
+
+def test_query_all_concurrently(monkeypatch, settings):
+    settings.add('input_file_folder', 'tests/fixtures/')
+    collection = ScenarioCollection.from_csv('regional_overview_scenarios')
+
+    # Both scenarios have to be queried at the same time to pass the barrier
+    both_queried = threading.Barrier(2, timeout=5)
+
+    def mockquery(scenario, query_list):
+        both_queried.wait()
+        # Results come back in another order, and without the last query for Belgium
+        factor = 1 if scenario.short_name == 'DE_Germany' else 10
+        keys = list(reversed(query_list))[factor // 10:]
+        scenario.query_results = pd.DataFrame({
+            'future': [len(key) * factor for key in keys],
+            'present': [1.0] * len(keys),
+            'unit': ['PJ'] * len(keys)
+        }, index=keys)
+
+    monkeypatch.setattr(Scenario, "query", mockquery)
+
+    future, present, units = collection.query_all(['a', 'bb', 'ccc'], max_workers=2)
+
+    np.testing.assert_array_equal(future, [[1, 10], [2, 20], [3, np.nan]])
+    np.testing.assert_array_equal(present, [[1, 1], [1, 1], [1, np.nan]])
+    assert units == ['PJ', 'PJ', 'PJ']
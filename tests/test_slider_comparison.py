@@ -0,0 +1,94 @@
+'''Tests for the SliderComparison'''
+
+import itertools
+import re
+
+import pandas as pd
+import pytest
+
+from helpers.ETM_API import SessionWithUrlBase
+from helpers.slider_comparison import SliderComparison
+
+BASE_URL = 'http://fake.session'
+
+
+@pytest.fixture
+def fake_engine(requests_mock, default_scenario):
+    '''
+    An engine that creates copies of scenarios, and answers each gquery with the
+    sum of the user values of the scenario. The base scenario sets slider c.
+    '''
+    ids = itertools.count(1000)
+    user_values = {default_scenario.id: {'c': 1.0}}
+    created = []
+
+    def create(request, context):
+        scenario_id = next(ids)
+        source = request.json()['scenario'].get('scenario_id')
+        user_values[scenario_id] = dict(user_values.get(source, {}))
+        created.append(scenario_id)
+        return {'id': scenario_id, 'end_year': 2050}
+
+    def show(request, context):
+        return {'user_values': user_values[int(request.path.split('/')[2])]}
+
+    def update(request, context):
+        scenario_id = int(request.path.split('/')[2])
+        data = request.json()
+        for key, value in data['scenario'].get('user_values', {}).items():
+            if value == 'reset':
+                user_values[scenario_id].pop(key, None)
+            else:
+                user_values[scenario_id][key] = value
+        total = sum(user_values[scenario_id].values())
+
+        return {'gqueries': {
+            query: {'present': 0.0, 'future': total, 'unit': 'PJ'}
+            for query in data.get('gqueries', [])
+        }}
+
+    def delete(request, context):
+        del user_values[int(request.path.split('/')[2])]
+        return {}
+
+    scenario_url = re.compile(f'{BASE_URL}/scenarios/\\d+(\\?.*)?$')
+    requests_mock.post(f'{BASE_URL}/scenarios', json=create)
+    requests_mock.get(scenario_url, json=show)
+    requests_mock.put(scenario_url, json=update)
+    requests_mock.delete(scenario_url, json=delete)
+
+    return {'user_values': user_values, 'created': created}
+
+
+@pytest.fixture
+def slider_settings():
+    return pd.DataFrame({
+        'set_name': ['single', 'double', 'double'],
+        'slider_name': ['a', 'a', 'b'],
+        'slider_start_value': [None, 2.0, 3.0],
+        'slider_future_value': [15.0, 20.0, 30.0],
+        'output_gquery': ['q', 'q', 'q']
+    })
+
+
+@pytest.mark.parametrize('diff_slider_updates', [True, False])
+@pytest.mark.parametrize('max_workers', [1, 2])
+def test_run_evaluates_each_set_in_a_scratch_copy(default_scenario, fake_engine, slider_settings,
+                                                  max_workers, diff_slider_updates, settings):
+    settings.add('merge_engine_requests', True)
+    settings.add('diff_slider_updates', diff_slider_updates)
+    default_scenario.setup_connection(SessionWithUrlBase(BASE_URL))
+    slider_settings = pd.concat([slider_settings, slider_settings.assign(set_name='again')])
+
+    results = SliderComparison(default_scenario, max_workers=max_workers).run(slider_settings)
+
+    assert list(results.index) == ['single', 'double', 'again']
+    assert list(results['output_gquery']) == ['q'] * 3
+    assert list(results['unit']) == ['PJ'] * 3
+    assert list(results['result_start_value']) == [1.0, 6.0, 6.0]
+    assert list(results['result_future_value']) == [16.0, 51.0, 51.0]
+
+    # One copy per worker, deleted afterwards, and the base scenario is not changed
+    assert len(fake_engine['created']) == max_workers
+    assert list(fake_engine['user_values']) == [default_scenario.id]
+    assert fake_engine['user_values'][default_scenario.id] == {'c': 1.0}
@@ -0,0 +1,140 @@
+import gc
+import re
+import threading
+
+import pandas as pd
+import pytest
+
+from helpers.ETM_API import SessionWithUrlBase
+from helpers.Template import Template, TemplateCollection
+
+BASE_URL = 'http://fake.session'
+
+
+@pytest.fixture
+def templates():
+    return TemplateCollection([
+        Template(pd.Series({'id': template_id, 'title': f'template_{template_id}'}))
+        for template_id in [1, 2, 3]
+    ])
+
+
+@pytest.fixture
+def fake_engine(requests_mock, templates):
+    for template in templates:
+        url = f'{BASE_URL}/scenarios/{template.id}'
+        requests_mock.get(url, json={
+            'user_values': {'input': template.id},
+            'balanced_values': {'balanced_input': template.id * 10}
+        })
+        requests_mock.get(f'{url}/heat_network_order', json={'order': ['a', 'b']})
+        requests_mock.get(f'{url}/custom_curves', json=[])
+
+        for order in Template.CUSTOM_ORDERS:
+            requests_mock.get(f'{url}/{order}', json={'order': [order, str(template.id)]})
+
+
+@pytest.mark.parametrize('max_workers', [1, 3])
+def test_harvest_complete_mode(templates, fake_engine, tmp_path, max_workers, settings):
+    settings.add('output_orders_folder', str(tmp_path))
+    settings.add('output_curves_folder', str(tmp_path))
+
+    templates.harvest(SessionWithUrlBase(BASE_URL), complete_mode=True, max_workers=max_workers)
+
+    for template in templates:
+        assert template.user_values == {'input': template.id}
+        assert template.balanced_values == {'balanced_input': template.id * 10}
+        assert list(template.heat_network_orders.index) == Template.HEAT_ORDERS
+        assert list(template.heat_network_orders[template.title]) == ['a b'] * 3
+        assert list(template.custom_orders.columns) == Template.CUSTOM_ORDERS
+        assert template.custom_orders.iloc[0, 0] == f'hydrogen_supply_order {template.id}'
+
+
+def test_harvest_shares_one_pool(templates, requests_mock, tmp_path, settings):
+    '''All templates and the requests within them run on the threads of one pool'''
+    settings.add('output_orders_folder', str(tmp_path))
+    settings.add('output_curves_folder', str(tmp_path))
+    threads = set()
+
+    def respond(request, context):
+        threads.add(threading.get_ident())
+        if request.path.endswith('/custom_curves'):
+            return [{'key': key, 'attached': True} for key in ['a', 'b', 'c', 'd']]
+
+        return {'order': ['a'], 'user_values': {}, 'balanced_values': {}}
+
+    requests_mock.get(re.compile(f'{BASE_URL}/scenarios/\\d+(/[a-z_]+)?(\\?.*)?$'), json=respond)
+    requests_mock.get(re.compile(f'{BASE_URL}/.*\\.csv$'), text='1.0\n' * 8760)
+
+    templates.harvest(SessionWithUrlBase(BASE_URL), complete_mode=True, max_workers=2)
+
+    # The two threads of the pool, and the thread calling harvest
+    assert len(threads) <= 3
+    assert all(list(template.custom_curves.columns) == ['a', 'b', 'c', 'd'] for template in templates)
+
+
+def test_session_limits_concurrent_requests(settings):
+    settings.add('max_concurrent_requests', 2)
+    session = SessionWithUrlBase(BASE_URL)
+    settings.add('max_concurrent_requests', None)
+
+    assert session.request_limit._value == 2
+    assert SessionWithUrlBase(BASE_URL).request_limit is None
+
+
+def test_session_holds_the_limit_while_streaming(requests_mock, settings):
+    settings.add('max_concurrent_requests', 1)
+    session = SessionWithUrlBase(BASE_URL)
+    requests_mock.get(f'{BASE_URL}/download', text='data')
+
+    with session.get('/download', stream=True) as response:
+        assert session.request_limit._value == 0
+        assert response.text == 'data'
+
+    response.close()
+    assert session.request_limit._value == 1
+
+
+def test_session_releases_the_limit_of_unclosed_streams(requests_mock, settings):
+    settings.add('max_concurrent_requests', 1)
+    session = SessionWithUrlBase(BASE_URL)
+    requests_mock.get(f'{BASE_URL}/download', text='data')
+
+    # Read completely, but not closed
+    response = session.get('/download', stream=True)
+    assert b''.join(response.iter_content(2)) == b'data'
+    assert session.request_limit._value == 1
+
+    # Neither read nor closed
+    response = session.get('/download', stream=True)
+    assert session.request_limit._value == 0
+    del response
+    gc.collect()
+    assert session.request_limit._value == 1
+
+
+def reference_to_csv(templates, path):
+    '''The original, cell by cell export, with the rows sorted'''
+    ids = [template.id for template in templates]
+    keys = sorted(set().union(*(template.user_values for template in templates)))
+    df = pd.DataFrame(columns=ids, index=keys)
+    for template in templates:
+        for input_key, val in template.user_values.items():
+            df.loc[input_key, template.id] = val
+
+    df.columns = pd.MultiIndex.from_tuples(zip([template.title for template in templates], ids))
+    df.to_csv(path, index=True, header=True)
+
+
+@pytest.mark.parametrize('chunk_size', [None, 2, 1000])
+def test_to_csv(templates, tmp_path, chunk_size, settings):
+    settings.add('output_file_folder', str(tmp_path))
+    settings.add('output_format', 'csv')
+    user_values = [{'b': 1.5, 'a': 5}, {'c': 'reset'}, {'a': 2.0, 'd': 0, 'e': 1}]
+    for template, values in zip(templates, user_values):
+        template.add_user_values(values)
+
+    templates.to_csv('template_settings', chunk_size=chunk_size)
+    reference_to_csv(templates, tmp_path / 'reference.csv')
+
+    assert (tmp_path / 'template_settings.csv').read_text() == (tmp_path / 'reference.csv').read_text()